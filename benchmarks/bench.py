@@ -0,0 +1,327 @@
+'''
+Benchmarks of the extraction hot paths.
+
+Usage:
+    python benchmarks/bench.py                       # run all benchmarks
+    python benchmarks/bench.py -k group -k url       # run only the matching benchmarks
+    python benchmarks/bench.py --json after.json     # save the results
+    python benchmarks/bench.py --rev master --json before.json  # benchmark another git revision
+    python benchmarks/bench.py --compare before.json after.json
+
+Every benchmark parses a synthetic corpus of the given size (number of records
+per document) and reports the throughput in documents and megabytes per second.
+'''
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+
+SIZES = {'small': 10, 'medium': 500, 'large': 5000}
+
+
+# ---------------------------------------------------------------------------
+# corpora
+# ---------------------------------------------------------------------------
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+         'tempor incididunt ut labore et dolore magna aliqua').split()
+
+
+def _words(rnd, n):
+    return ' '.join(rnd.choice(WORDS) for _ in range(n))
+
+
+def listing_html(n, seed=0):
+    '''Product listing page, with navigation and the usual markup noise around the records.'''
+    rnd = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Listing</title>',
+        '<script>var tracking = {"page": "listing"};</script></head><body>',
+        '<nav><ul>%s</ul></nav>' % ''.join(
+            '<li><a href="/category/%d">%s</a></li>' % (i, _words(rnd, 2)) for i in range(30)),
+        '<div id="products">']
+    for i in range(n):
+        created = start + timedelta(minutes=rnd.randint(0, 10 ** 6))
+        parts.append(
+            '<div class="product" data-id="%d">'
+            '<h2 class="title"><a href="/product/%d?ref=listing">%s <b>%s</b></a></h2>'
+            '<div class="price"><span>%d.%02d</span><meta content="EUR"></div>'
+            '<p class="description">%s <i>%s</i> %s</p>'
+            '<time datetime="%s">%s</time>'
+            '<ul class="tags">%s</ul>'
+            '</div>' % (
+                i, i, _words(rnd, 3), _words(rnd, 1), rnd.randint(1, 999), rnd.randint(0, 99),
+                _words(rnd, 10), _words(rnd, 2), _words(rnd, 5),
+                created.strftime('%Y-%m-%dT%H:%M:%S'), created.strftime('%d.%m.%Y %H:%M'),
+                ''.join('<li><a href="tag/%s">%s</a></li>' % (w, w) for w in _words(rnd, 3).split())))
+    parts.append('</div><footer>%s</footer></body></html>' % _words(rnd, 50))
+    return ''.join(parts)
+
+
+def nested_html(n, depth, seed=0):
+    '''Records nested `depth` levels deep, e.g. category > subcategory > item.'''
+    rnd = random.Random(seed)
+
+    def level(d):
+        if d > depth:
+            return ''
+        return ''.join('<div class="level%d"><span class="name">%s</span>%s</div>' % (
+            d, _words(rnd, 2), level(d + 1)) for _ in range(2))
+
+    records = ''.join('<div class="record">%s</div>' % level(1) for _ in range(n))
+    return '<html><body>%s</body></html>' % records
+
+
+def feed_xml(n, seed=0):
+    rnd = random.Random(seed)
+    items = ''.join(
+        '<item id="%d"><title>%s</title><link>/item/%d</link><price currency="EUR">%d</price>'
+        '<category>%s</category></item>' % (i, _words(rnd, 4), i, rnd.randint(1, 999), rnd.choice(WORDS))
+        for i in range(n))
+    return '<?xml version="1.0" encoding="UTF-8"?><feed>%s</feed>' % items
+
+
+# ---------------------------------------------------------------------------
+# benchmarks
+# ---------------------------------------------------------------------------
+
+def _nested_group(depth):
+    from xextract import Group, String
+
+    children = []
+    for d in range(depth, 0, -1):
+        children = [Group(name='children', xpath='div[@class="level%d"]' % d, children=[
+            String(name='name', xpath='span[@class="name"]', count=1)] + children)]
+    return Group(css='.record', children=children)
+
+
+def bench_group_nesting(size, depth):
+    return _nested_group(depth), nested_html(size, depth), 'parse'
+
+
+def bench_string_all_text(size):
+    from xextract import Group, String
+    parser = Group(css='.product', children=[
+        String(name='title', css='.title', attr='_all_text', count=1),
+        String(name='description', css='.description', attr='_all_text', count=1)])
+    return parser, listing_html(size), 'parse'
+
+
+def bench_url_base(size):
+    from xextract import Group, Url
+    parser = Group(css='.product', children=[
+        Url(name='link', css='.title a', count=1),
+        Url(name='tags', css='.tags a')])
+    return parser, listing_html(size), 'parse', 'http://example.com/shop/listing?page=1'
+
+
+def bench_group_shared_prefix(size):
+    from xextract import Group, String, Url
+    parser = Group(css='.product', children=[
+        String(name='price', css='.price span', count=1),
+        String(name='currency', css='.price meta', attr='content', count=1),
+        Url(name='link', css='.title a', count=1),
+        String(name='title', css='.title b', count=1),
+        Url(name='tags', css='.tags a')])
+    return parser, listing_html(size), 'parse', 'http://example.com/'
+
+
+def bench_datetime(size):
+    from xextract import DateTime
+    parser = DateTime(css='.product time', format='%d.%m.%Y %H:%M')
+    return parser, listing_html(size), 'parse'
+
+
+def bench_datetime_iso(size):
+    from xextract import DateTime
+    parser = DateTime(css='.product time', attr='datetime', format='%Y-%m-%dT%H:%M:%S')
+    return parser, listing_html(size), 'parse'
+
+
+def bench_element(size):
+    from xextract import Element
+    return Element(css='.product'), listing_html(size), 'parse'
+
+
+def _feed_parser():
+    from xextract import Group, String, Url
+    return Group(xpath='//item', children=[
+        String(name='id', attr='id', count=1),
+        String(name='title', xpath='title', count=1),
+        Url(name='link', xpath='link', attr='_text', count=1),
+        String(name='currency', xpath='price', attr='currency', count=1)])
+
+
+def bench_parse_auto(size):
+    return _feed_parser(), feed_xml(size), 'parse'
+
+
+def bench_parse_xml(size):
+    return _feed_parser(), feed_xml(size), 'parse_xml'
+
+
+def bench_parse_bytes(size):
+    from xextract import Group, String
+    parser = Group(css='.product', children=[String(name='title', css='.title a', count=1)])
+    return parser, listing_html(size).encode('utf-8'), 'parse'
+
+
+def bench_parse_html(size):
+    from xextract import Group, String
+    parser = Group(css='.product', children=[String(name='title', css='.title a', count=1)])
+    return parser, listing_html(size), 'parse_html'
+
+
+BENCHMARKS = [
+    ('group_nesting_depth1', lambda size: bench_group_nesting(size, 1)),
+    ('group_nesting_depth3', lambda size: bench_group_nesting(size, 3)),
+    ('group_nesting_depth5', lambda size: bench_group_nesting(max(1, size // 8), 5)),
+    ('string_all_text', bench_string_all_text),
+    ('url_base', bench_url_base),
+    ('group_shared_prefix', bench_group_shared_prefix),
+    ('datetime', bench_datetime),
+    ('datetime_iso', bench_datetime_iso),
+    ('element', bench_element),
+    ('parse_auto', bench_parse_auto),
+    ('parse_xml', bench_parse_xml),
+    ('parse_html', bench_parse_html),
+    ('parse_bytes', bench_parse_bytes),
+]
+
+
+# ---------------------------------------------------------------------------
+# runner
+# ---------------------------------------------------------------------------
+
+def measure(parser, body, method, url=None, min_time=0.2, repeat=3):
+    '''Return the best time of a single parse, out of `repeat` rounds lasting at least `min_time`.'''
+    parse = getattr(parser, method)
+    parse(body, url)  # warm up
+
+    best = None
+    for _ in range(repeat):
+        loops = 0
+        start = time.perf_counter()
+        while True:
+            parse(body, url)
+            loops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        per_doc = elapsed / loops
+        best = per_doc if best is None else min(best, per_doc)
+    return best
+
+
+def run(names, sizes, min_time, repeat, other_revision=False):
+    '''
+    Run the selected benchmarks, return the results and the keys of the failed ones.
+    When benchmarking `other_revision`, a failing benchmark is only reported as unsupported.
+    '''
+    results = {}
+    failures = []
+    for name, setup in BENCHMARKS:
+        if names and not any(n in name for n in names):
+            continue
+        for size_name in sizes:
+            key = '%s[%s]' % (name, size_name)
+            try:
+                args = setup(SIZES[size_name])
+                parser, body, method = args[:3]
+                url = args[3] if len(args) > 3 else None
+                per_doc = measure(parser, body, method, url, min_time, repeat)
+            except Exception as e:
+                if other_revision:
+                    # e.g. the feature doesn't exist in the benchmarked revision yet
+                    print('%-32s unsupported (%s: %s)' % (key, type(e).__name__, e))
+                else:
+                    print('%-32s FAILED' % key)
+                    traceback.print_exc(file=sys.stdout)
+                    failures.append(key)
+                sys.stdout.flush()
+                continue
+            mb = len(body if isinstance(body, bytes) else body.encode('utf-8')) / 1e6
+            results[key] = {'docs_per_s': 1 / per_doc, 'mb_per_s': mb / per_doc, 'doc_mb': mb}
+            print('%-32s %12.1f docs/s %10.2f MB/s' % (key, 1 / per_doc, mb / per_doc))
+            sys.stdout.flush()
+    return results, failures
+
+
+def run_revision(rev, argv):
+    '''Run this script against the xextract package checked out at git revision `rev`.'''
+    repo = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], universal_newlines=True).strip()
+    tmp_dir = tempfile.mkdtemp(prefix='xextract-bench-')
+    worktree = os.path.join(tmp_dir, 'tree')
+    subprocess.check_call(['git', 'worktree', 'add', '--detach', worktree, rev], cwd=repo)
+    try:
+        env = dict(os.environ, XEXTRACT_BENCH_PATH=worktree)
+        return subprocess.call([sys.executable, os.path.abspath(__file__)] + argv, env=env)
+    finally:
+        subprocess.check_call(['git', 'worktree', 'remove', '--force', worktree], cwd=repo)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)['results']
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    print('%-32s %14s %14s %9s' % ('benchmark', 'before docs/s', 'after docs/s', 'change'))
+    for key in sorted(set(before) & set(after)):
+        b, a = before[key]['docs_per_s'], after[key]['docs_per_s']
+        print('%-32s %14.1f %14.1f %+8.1f%%' % (key, b, a, (a / b - 1) * 100))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('-k', dest='names', action='append', default=[],
+                            help='run only the benchmarks containing this substring')
+    arg_parser.add_argument('--sizes', default='small,medium,large',
+                            help='comma separated corpus sizes: %s' % ', '.join(sorted(SIZES)))
+    arg_parser.add_argument('--min-time', type=float, default=0.2, help='minimal duration of a round in seconds')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='number of rounds, the best one is reported')
+    arg_parser.add_argument('--json', help='save the results into this file')
+    arg_parser.add_argument('--rev', help='benchmark the given git revision instead of the importable xextract')
+    arg_parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two saved results')
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    if args.rev:
+        argv = sys.argv[1:]
+        i = argv.index('--rev')
+        del argv[i:i + 2]
+        return run_revision(args.rev, argv)
+
+    # benchmark the xextract package from this repository (or from the revision's worktree)
+    revision_path = os.environ.get('XEXTRACT_BENCH_PATH')
+    sys.path.insert(0, revision_path or os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import xextract
+    print('xextract %s from %s, Python %s' % (
+        xextract.__version__, os.path.dirname(xextract.__file__), platform.python_version()))
+    results, failures = run(args.names, args.sizes.split(','), args.min_time, args.repeat,
+                            other_revision=bool(revision_path))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2, sort_keys=True)
+
+    if failures:
+        print('%d benchmark(s) failed: %s' % (len(failures), ', '.join(failures)))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,6 +20,7 @@ setup(
     package_data={'': ['LICENSE']},
     include_package_data=True,
     install_requires=['lxml', 'cssselect'],
+    python_requires='>=3.7',
     test_suite='tests',
     license='MIT',
     zip_safe=False,
@@ -30,8 +31,6 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
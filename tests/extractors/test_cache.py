@@ -0,0 +1,81 @@
+import unittest
+
+from xextract.extractors import DocumentCache, HtmlXPathExtractor, XmlXPathExtractor
+from xextract.extractors import cache
+from xextract.parsers import Element, String
+
+
+class TestDocumentCache(unittest.TestCase):
+    def test_disabled(self):
+        document_cache = DocumentCache()
+        body = '<p>a</p>'
+        self.assertIsNot(document_cache.get_root(HtmlXPathExtractor, body),
+                         document_cache.get_root(HtmlXPathExtractor, body))
+        self.assertEqual(document_cache.stats()['documents'], 0)
+
+    def test_hit_miss(self):
+        document_cache = DocumentCache(max_size=1000)
+        body = '<p>a</p>'
+        root = document_cache.get_root(HtmlXPathExtractor, body)
+        self.assertIs(document_cache.get_root(HtmlXPathExtractor, ''.join(['<p>', 'a</p>'])), root)
+        # parsing mode is part of the key
+        self.assertIsNot(document_cache.get_root(XmlXPathExtractor, body), root)
+        self.assertDictEqual(document_cache.stats(), {
+            'hits': 1, 'misses': 2, 'evictions': 0, 'documents': 2, 'size': 2 * len(body)})
+
+    def test_eviction(self):
+        document_cache = DocumentCache(max_size=20)
+        bodies = ['<p>%s</p>' % i for i in range(4)]  # 8 characters each
+        roots = [document_cache.get_root(HtmlXPathExtractor, body) for body in bodies[:2]]
+        document_cache.get_root(HtmlXPathExtractor, bodies[0])  # bodies[1] is now least recently used
+        document_cache.get_root(HtmlXPathExtractor, bodies[2])
+        self.assertEqual(document_cache.evictions, 1)
+        self.assertIs(document_cache.get_root(HtmlXPathExtractor, bodies[0]), roots[0])
+        self.assertIsNot(document_cache.get_root(HtmlXPathExtractor, bodies[1]), roots[1])
+        # too big documents are not cached at all
+        document_cache.get_root(HtmlXPathExtractor, '<p>%s</p>' % ('x' * 20))
+        self.assertLessEqual(document_cache.stats()['size'], 20)
+
+    def test_hash_collision(self):
+        document_cache = DocumentCache(max_size=1000)
+
+        class CollidingStr(str):
+            def __hash__(self):
+                return 1
+
+        root = document_cache.get_root(HtmlXPathExtractor, CollidingStr('<p>a</p>'))
+        other = document_cache.get_root(HtmlXPathExtractor, CollidingStr('<p>b</p>'))
+        self.assertIsNot(other, root)
+        self.assertEqual(other.xpath('string()'), 'b')
+
+    def test_bytes(self):
+        document_cache = DocumentCache(max_size=1000)
+        body = b'<p>a</p>'
+        root = document_cache.get_root(HtmlXPathExtractor, body)
+        self.assertIs(document_cache.get_root(HtmlXPathExtractor, b'<p>a</p>'), root)
+        # transport-declared encoding is part of the key
+        self.assertIsNot(document_cache.get_root(HtmlXPathExtractor, body, 'iso-8859-1'), root)
+        # as well as the parser options
+        with_options = document_cache.get_root(HtmlXPathExtractor, body, remove_comments=True)
+        self.assertIsNot(with_options, root)
+        self.assertIs(document_cache.get_root(HtmlXPathExtractor, body, remove_comments=True), with_options)
+        # mutable bodies are never cached
+        mutable = bytearray(body)
+        self.assertIsNot(document_cache.get_root(HtmlXPathExtractor, mutable),
+                         document_cache.get_root(HtmlXPathExtractor, mutable))
+        self.assertEqual(document_cache.get_root(HtmlXPathExtractor, memoryview(mutable)).xpath('string()'), 'a')
+        self.assertEqual(document_cache.stats()['documents'], 3)
+
+    def test_parsers(self):
+        original_max_size = cache.document_cache.max_size
+        cache.document_cache.clear()
+        cache.document_cache.max_size = 10000
+        try:
+            body = '<p>hello</p>'
+            first = Element(css='p', count=1).parse(body)
+            self.assertEqual(String(css='p', count=1).parse_html(body), 'hello')
+            self.assertIs(Element(css='p', count=1).parse(body), first)
+            self.assertEqual(cache.document_cache.hits, 2)
+        finally:
+            cache.document_cache.max_size = original_max_size
+            cache.document_cache.clear()
@@ -1,6 +1,8 @@
+from io import BytesIO
+import threading
 import unittest
 
-from xextract.extractors.lxml_extractor import XPathExtractor, XmlXPathExtractor, HtmlXPathExtractor
+from xextract.extractors.lxml_extractor import XPathExtractor, XmlXPathExtractor, HtmlXPathExtractor, looks_like_xml
 
 
 class TestXpathExtractor(unittest.TestCase):
@@ -152,6 +154,96 @@ class TestXpathExtractor(unittest.TestCase):
         self.hxs_cls(text).select('//text()').extract()
         self.xxs_cls(text).select('//text()').extract()
 
+    def test_bytes_input(self):
+        html = '<html><body><p>čau</p></body></html>'
+        for body in (html.encode('utf-8'), bytearray(html.encode('utf-8')), memoryview(html.encode('utf-8'))):
+            self.assertEqual(self.hxs_cls(body).select('//p/text()').extract(), ['čau'])
+        self.assertEqual(self.hxs_cls(b'  \n ').select('//text()').extract(), [])
+        self.assertEqual(self.xxs_cls(bytearray(b' ')).select('//text()').extract(), [])
+
+    def test_bytes_encoding(self):
+        # declared in the document
+        body = '<?xml version="1.0" encoding="iso-8859-2"?><p>čau</p>'.encode('iso-8859-2')
+        self.assertEqual(self.xxs_cls(b'\n  ' + body).select('//p/text()').extract(), ['čau'])
+        body = '<html><head><meta charset="iso-8859-2"></head><p>čau</p></html>'.encode('iso-8859-2')
+        self.assertEqual(self.hxs_cls(body).select('//p/text()').extract(), ['čau'])
+        # declared after the first kilobyte, but still in the head
+        body = ('<html><head><script>%s</script><meta charset="iso-8859-2"></head><p>čau</p></html>' %
+                ('x' * 2000)).encode('iso-8859-2')
+        self.assertEqual(self.hxs_cls(body).select('//p/text()').extract(), ['čau'])
+        self.assertEqual(self.hxs_cls.from_file(BytesIO(body)).select('//p/text()').extract(), ['čau'])
+        # undeclared
+        body = ('<html><head><script>%s</script></head><p>čau</p></html>' % ('x' * 2000)).encode('utf-8')
+        self.assertEqual(self.hxs_cls(body).select('//p/text()').extract(), ['čau'])
+        self.assertEqual(self.hxs_cls.from_file(BytesIO(body)).select('//p/text()').extract(), ['čau'])
+        # transport-declared encoding
+        body = '<p>čau</p>'.encode('iso-8859-2')
+        self.assertEqual(self.hxs_cls(body, encoding='iso-8859-2').select('//p/text()').extract(), ['čau'])
+        # byte order mark takes precedence over the transport-declared encoding
+        body = '\ufeff<p>čau</p>'.encode('utf-16-le')
+        self.assertEqual(self.hxs_cls(body, encoding='iso-8859-2').select('//p/text()').extract(), ['čau'])
+        body = '\ufeff<p>čau</p>'.encode('utf-8')
+        self.assertEqual(self.hxs_cls(body, encoding='iso-8859-2').select('//p/text()').extract(), ['čau'])
+
+    def test_str_encoding_declaration(self):
+        xml = '<?xml version="1.0" encoding="UTF-8"?><p>čau</p>'
+        self.assertEqual(self.xxs_cls(xml).select('//p/text()').extract(), ['čau'])
+
+    def test_from_file(self):
+        body = ('\n<?xml version="1.0" encoding="iso-8859-2"?><p>' + 'x' * 5000 + 'č</p>').encode('iso-8859-2')
+        x = self.xxs_cls.from_file(BytesIO(body))
+        self.assertEqual(x.select('//p/text()').extract(), ['x' * 5000 + 'č'])
+        x = self.hxs_cls.from_file(BytesIO('<p>čau</p>'.encode('utf-8')))
+        self.assertEqual(x.select('//p/text()').extract(), ['čau'])
+        self.assertEqual(self.hxs_cls.from_file(BytesIO(b'')).select('//text()').extract(), [])
+        self.assertEqual(self.xxs_cls.from_file(BytesIO(b'  ')).select('//text()').extract(), [])
+        # documents without the root element
+        self.assertEqual(self.hxs_cls.from_file(BytesIO(b'<!-- c -->')).select('//p').extract(), [])
+        self.assertEqual(self.xxs_cls.from_file(BytesIO(b'<?xml version="1.0"?>')).select('//p').extract(), [])
+
+    def test_parser_options(self):
+        html = '<div>\n  <!-- comment --><p id="a">text</p>\n</div>'
+        self.assertEqual(len(self.hxs_cls(html).select('//comment()')), 1)
+        x = self.hxs_cls(html, remove_comments=True)
+        self.assertEqual(len(x.select('//comment()')), 0)
+        x = self.xxs_cls(html.encode('utf-8'), remove_blank_text=True, collect_ids=False, huge_tree=True)
+        self.assertEqual(x.select('//div/text()').extract(), [])
+        self.assertEqual(x.select('//p/@id').extract(), ['a'])
+        x = self.xxs_cls.from_file(BytesIO(html.encode('utf-8')), remove_comments=True)
+        self.assertEqual(len(x.select('//comment()')), 0)
+        self.assertRaises(TypeError, self.hxs_cls, html, strip_cdata=False)
+
+    def test_parser_pool(self):
+        parser = self.hxs_cls._get_parser(b'<p/>')
+        self.assertIs(self.hxs_cls._get_parser(b'<p/>'), parser)
+        self.assertIsNot(self.hxs_cls._get_parser(b'<p/>', 'iso-8859-2'), parser)
+        self.assertIsNot(self.hxs_cls._get_parser(b'<p/>', options=(('remove_comments', True),)), parser)
+        self.assertIsNot(self.xxs_cls._get_parser(b'<p/>'), parser)
+        self.assertIsNot(self.hxs_cls._get_parser(b'<p/>', pooled=False), parser)
+
+        # every thread has its own parsers
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.hxs_cls._get_parser(b'<p/>')))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], parser)
+
+        # documents parsed by the same parser are independent
+        first = self.hxs_cls(b'<p>a</p>')
+        second = self.hxs_cls(b'<p>b</p>')
+        self.assertEqual(first.select('//p/text()').extract(), ['a'])
+        self.assertEqual(second.select('//p/text()').extract(), ['b'])
+
+    def test_looks_like_xml(self):
+        xml = '<?xml version="1.0"?><a/>'
+        self.assertTrue(looks_like_xml(xml))
+        self.assertTrue(looks_like_xml(xml.encode('utf-8')))
+        self.assertTrue(looks_like_xml(memoryview(xml.encode('utf-8'))))
+        self.assertTrue(looks_like_xml(('\ufeff' + xml).encode('utf-16-le')))
+        self.assertTrue(looks_like_xml(('\ufeff' + xml).encode('utf-32-be')))
+        self.assertFalse(looks_like_xml(b'<html/>'))
+        self.assertFalse(looks_like_xml(bytearray()))
+
     def test_select_on_unevaluable_nodes(self):
         r = self.hxs_cls('<span class="big">some text</span>')
         # Text node
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import unittest
+
+from xextract.parsers import String
+
+
+class TestAio(unittest.TestCase):
+    parser = String(css='span', count=1, callback=int)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_aparse(self):
+        self.assertEqual(self.run_async(self.parser.aparse('<span>1</span>')), 1)
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(self.run_async(self.parser.aparse('<span>2</span>', executor=executor)), 2)
+
+    def test_aparse_stream(self):
+        async def bodies():
+            for i in range(20):
+                yield '<span>%s</span>' % i
+
+        async def collect(bodies, **kwargs):
+            return [result async for result in self.parser.aparse_stream(bodies, **kwargs)]
+
+        self.assertListEqual(self.run_async(collect(bodies(), max_in_flight=3)), list(range(20)))
+        # plain iterables and (body, url) pairs are accepted as well
+        items = [('<span>%s</span>' % i, 'http://example.com/') for i in range(5)]
+        self.assertListEqual(self.run_async(collect(items)), list(range(5)))
+        self.assertRaises(ValueError, self.run_async, collect(items, max_in_flight=0))
+
+    def test_backpressure(self):
+        taken = []
+
+        def bodies():
+            for i in range(100):
+                taken.append(i)
+                yield '<span>%s</span>' % i
+
+        async def take_first():
+            stream = self.parser.aparse_stream(bodies(), max_in_flight=4)
+            result = await stream.__anext__()
+            await stream.aclose()
+            return result
+
+        self.assertEqual(self.run_async(take_first()), 0)
+        self.assertEqual(len(taken), 4)
+
+    def test_cancel(self):
+        started = []
+        release = threading.Event()
+
+        class SlowParser(String):
+            def parse(self, body, url=None):
+                started.append(body)
+                release.wait(5)
+                return super(SlowParser, self).parse(body, url)
+
+        parser = SlowParser(css='span', count=1)
+
+        async def consume():
+            async for _ in parser.aparse_stream(['<span>%s</span>' % i for i in range(10)],
+                                                executor=executor, max_in_flight=5):
+                pass
+
+        with ThreadPoolExecutor(1) as executor:
+            task = self.loop.create_task(consume())
+            self.loop.call_later(0.05, task.cancel)
+            self.assertRaises(asyncio.CancelledError, self.run_async, task)
+            release.set()
+        # only the first document was started, the queued ones were dropped
+        self.assertListEqual(started, ['<span>0</span>'])
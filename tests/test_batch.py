@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import unittest
+
+from xextract.batch import parse_many, parse_concurrent
+from xextract.parsers import ParserError, ParserSet, Group, String, Url
+
+
+def build_parser():
+    return Group(css='li', children=[
+        String(name='id', attr='id', count=1, callback=int),
+        Url(name='link', css='a', count='?')
+    ])
+
+
+def build_body(i):
+    return '<ul><li id="%s"><a href="/item/%s">item</a></li></ul>' % (i, i)
+
+
+def build_result(i, url=None):
+    link = '/item/%s' % i
+    if url:
+        link = url.rstrip('/') + link
+    return [{'id': i, 'link': link}]
+
+
+class TestPickle(unittest.TestCase):
+    def test_pickle(self):
+        parser = build_parser().compile()
+        unpickled = pickle.loads(pickle.dumps(parser))
+        # compiled xpaths are dropped...
+        self.assertFalse(hasattr(unpickled._compiled, 'xpath'))
+        self.assertFalse(hasattr(unpickled.children[0]._compiled, 'attr'))
+        # ...and compiled again when needed
+        self.assertListEqual(unpickled.parse(build_body(1)), build_result(1))
+        # original parser is untouched
+        self.assertTrue(hasattr(parser._compiled, 'xpath'))
+
+
+class TestParseMany(unittest.TestCase):
+    def test_ordered(self):
+        bodies = [build_body(i) for i in range(20)]
+        results = list(parse_many(build_parser(), bodies, workers=2, chunksize=3))
+        self.assertListEqual(results, [build_result(i) for i in range(20)])
+
+    def test_urls(self):
+        bodies = [build_body(i) for i in range(5)]
+        urls = ['http://example%s.com/' % i for i in range(5)]
+        results = list(parse_many(build_parser(), bodies, urls=urls, workers=2))
+        self.assertListEqual(results, [build_result(i, urls[i]) for i in range(5)])
+
+    def test_unordered(self):
+        bodies = [build_body(i) for i in range(20)]
+        results = list(parse_many(build_parser(), bodies, workers=2, chunksize=4, ordered=False))
+        self.assertListEqual(sorted(index for index, _ in results), list(range(20)))
+        for index, result in results:
+            self.assertListEqual(result, build_result(index))
+
+    def test_records(self):
+        # dynamically created record classes survive the trip from the worker processes
+        parser = Group(css='li', output='slots', children=[String(name='id', attr='id', count=1, callback=int)])
+        results = list(parse_many(parser, [build_body(i) for i in range(5)], workers=2))
+        self.assertListEqual([[record.id for record in result] for result in results], [[i] for i in range(5)])
+
+    def test_unpicklable_callback(self):
+        parser = Group(css='li', children=[String(name='id', attr='id', count=1, callback=lambda v: v)])
+        # raised right away, before any worker is started
+        with self.assertRaisesRegex(ParserError, r'Callback <function .*<lambda>.* of parser String\(id\)'):
+            parse_many(parser, [build_body(1)])
+        parser = ParserSet(ids=String(css='li', attr='id', batch_callback=lambda values: values))
+        self.assertRaisesRegex(ParserError, r'Batch callback .* of parser String', parse_many, parser, [])
+
+    def test_invalid_chunksize(self):
+        self.assertRaises(ValueError, list, parse_many(build_parser(), [], chunksize=0))
+
+
+class TestParseConcurrent(unittest.TestCase):
+    def test_basic(self):
+        bodies = [build_body(i) for i in range(50)]
+        urls = ['http://example%s.com/' % i for i in range(50)]
+        parser = build_parser()
+        self.assertListEqual(list(parser.parse_concurrent(bodies, max_workers=4)),
+                             [build_result(i) for i in range(50)])
+        self.assertListEqual(list(parse_concurrent(parser, bodies, urls=urls, max_workers=4)),
+                             [build_result(i, urls[i]) for i in range(50)])
+
+    def test_compiled_per_thread(self):
+        parser = build_parser().compile()
+        with ThreadPoolExecutor(1) as executor:
+            other = executor.submit(lambda: parser.compile().compiled_xpath).result()
+        self.assertIsNot(parser.compiled_xpath, other)
@@ -0,0 +1,64 @@
+from datetime import datetime
+import pickle
+import unittest
+
+from xextract.dates import DateTimeConverter, compile_format
+
+
+class TestCompileFormat(unittest.TestCase):
+    def test_supported(self):
+        for format in ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y %H:%M', '%Y%m%d', '%H:%M:%S.%f', '100%% %Y']:
+            self.assertIsNotNone(compile_format(format), format)
+
+    def test_unsupported(self):
+        for format in ['%b %d %Y', '%Y-%m-%d %p', '%y', '%d.%d', '%']:
+            self.assertIsNone(compile_format(format), format)
+
+
+class TestDateTimeConverter(unittest.TestCase):
+    formats = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y %H:%M', '%Y%m%d', '%H:%M:%S.%f',
+               '%m-%d', '(%Y) [%m]', '%d %b %Y']
+    values = ['2015-11-24', '2015-1-5', '2015-11-24T10:12:59', '2015-11-24T10:12:61',
+              '24.11.2015 10:12', '1.1.2001 22:14', '20.3.2002 0:0', ' 5.3.2002   1:2',
+              '24.11.2015 10:12 ', '20151124', '2015111', '10:12:13.5', '10:12:13.123456',
+              '10:12:13.1234567', '02-29', '02-28', '(2015) [11]', '2015-02-30', '24 Nov 2015',
+              '', 'x', '2015-11-24x']
+
+    def strptime(self, value, format):
+        try:
+            return datetime.strptime(value, format)
+        except ValueError as e:
+            return ValueError, str(e)
+
+    def convert(self, converter, value):
+        try:
+            return converter.convert(value)
+        except ValueError as e:
+            return ValueError, str(e)
+
+    def test_same_as_strptime(self):
+        for format in self.formats:
+            converter = DateTimeConverter(format)
+            for value in self.values:
+                expected = self.strptime(value, format)
+                self.assertEqual(self.convert(converter, value), expected, (format, value))
+                # cached value
+                self.assertEqual(self.convert(converter, value), expected, (format, value))
+
+    def test_convert_many(self):
+        converter = DateTimeConverter('%d.%m.%Y')
+        values = ['1.1.2001', '2.1.2001', '1.1.2001']
+        self.assertListEqual(converter.convert_many(values), [datetime.strptime(v, '%d.%m.%Y') for v in values])
+        self.assertRaises(ValueError, converter.convert_many, ['1.1.2001', '1.13.2001'])
+
+    def test_bounded_cache(self):
+        converter = DateTimeConverter('%Y', cache_size=2)
+        converter.convert_many(['2001', '2002', '2003'])
+        self.assertListEqual(list(converter._cache), ['2002', '2003'])
+
+    def test_pickle(self):
+        converter = DateTimeConverter('%Y')
+        converter.convert('2001')
+        unpickled = pickle.loads(pickle.dumps(converter))
+        self.assertDictEqual(unpickled._cache, {})
+        self.assertEqual(unpickled.convert('2001'), datetime(2001, 1, 1))
@@ -1,13 +1,22 @@
 from datetime import datetime, date
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse
+from io import BytesIO
 import copy
+import os
+import sys
+import tempfile
 import unittest
 
 from lxml import etree
 
+from xextract.extractors import HtmlXPathExtractor
+from xextract.records import numpy_available
+from xextract.selectors import css_to_xpath
+from xextract.stats import ParserStats
+
 from xextract.parsers import (
     ParserError, ParsingError, BaseParser, BaseNamedParser,
-    Prefix, Group, Element, String, Url, DateTime, Date)
+    Prefix, Group, Element, String, Url, DateTime, Date, ParserSet)
 
 
 class TestBuild(unittest.TestCase):
@@ -75,6 +84,134 @@ class TestParser(TestBaseParser):
         self.assertEqual(len(MockParser(css='ul').parse(html)), 1)
         self.assertEqual(len(MockParser(css='li').parse(html)), 2)
 
+    def test_raw_nodes(self):
+        html = '<ul><li>a</li><li>b</li></ul>'
+        # parsers work with raw lxml nodes internally
+        nodes = MockParser(css='li').parse(html)
+        self.assertTrue(all(isinstance(node, etree._Element) for node in nodes))
+        # extractor instance can be still passed to parse()
+        nodes = MockParser(css='li').parse(HtmlXPathExtractor(html))
+        self.assertListEqual([node.text for node in nodes], ['a', 'b'])
+
+    def test_bytes_extraction(self):
+        html = '<ul><li>č</li><li>b</li></ul>'
+        self.assertEqual(len(MockParser(css='li').parse(html.encode('utf-8'))), 2)
+        self.assertEqual(len(MockParser(css='li').parse_html(memoryview(html.encode('utf-8')))), 2)
+        nodes = MockParser(css='li').parse(html.encode('iso-8859-2'), encoding='iso-8859-2')
+        self.assertEqual(nodes[0].text, 'č')
+
+        # encoding declared after the first kilobyte of the head
+        body = ('<html><head><script>%s</script><meta charset="iso-8859-1"></head><body><p>café</p></body></html>' %
+                ('x' * 2000)).encode('iso-8859-1')
+        self.assertListEqual(String(css='p').parse_html(body), ['café'])
+        self.assertListEqual(String(css='p').parse_file(BytesIO(body)), ['café'])
+        for chunk_size in (1, 100, 4096):
+            session = String(css='p').feed_session()
+            for i in range(0, len(body), chunk_size):
+                session.feed(body[i:i + chunk_size])
+            self.assertListEqual(session.close(), ['café'])
+
+    def test_bytes_encoding_paths(self):
+        def parse_all(body, **kwargs):
+            session = String(css='p').feed_session(**kwargs)
+            for i in range(0, len(body), 4096):
+                session.feed(body[i:i + 4096])
+            return [String(css='p').parse(body, **kwargs),
+                    String(css='p').parse_file(BytesIO(body), **kwargs),
+                    session.close()]
+
+        script = '<script>%s</script>' % ('x' * 70000)  # head longer than the prescan
+        for html, encoding, kwargs in (
+                ('<html><head>%s</head><p>café</p></html>' % script, 'utf-8', {}),
+                # declaration after the prescanned part of the document is ignored
+                ('<html><head>%s<meta charset="utf-8"></head><p>café</p></html>' % script, 'utf-8', {}),
+                ('<html><head><meta charset="iso-8859-2">%s</head><p>čau</p></html>' % script, 'iso-8859-2', {}),
+                # only <meta charset=...> counts, not in the comments
+                ('<head><meta name="x" content="charset"><!-- <meta charset="iso-8859-2"> --></head><p>čau</p>',
+                 'utf-8', {}),
+                ('<head><!-- <meta charset="utf-8"></head><p>', 'utf-8', {}),
+                # Python spelling of the transport-declared encoding
+                ('<p>café</p>', 'latin-1', {'encoding': 'latin-1'}),
+                ('<p>café</p>', 'iso-8859-1', {'encoding': 'ISO_8859_1'}),
+                # unsupported one is ignored
+                ('<p>café</p>', 'utf-8', {'encoding': 'x-unknown'})):
+            body = html.encode(encoding)
+            expected = String(css='p').parse(html)
+            self.assertListEqual(parse_all(body, **kwargs), [expected] * 3, html[:100])
+
+        # XML is recognized also in bytes
+        xml = b'\n <?xml version="1.0" encoding="UTF-8"?><ul><li>a</li></ul>'
+        self.assertEqual(len(MockParser(xpath='li').parse(xml)), 1)
+        self.assertEqual(len(MockParser(xpath='li').parse_xml(bytearray(xml))), 1)
+
+    def test_parse_file(self):
+        html = '  <ul><li>č</li><li>b</li></ul>'.encode('utf-8')
+        xml = b'\n <?xml version="1.0" encoding="UTF-8"?><ul><li>a</li></ul>'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, content in (('page.html', html), ('feed.xml', xml), ('empty.html', b'')):
+                with open(os.path.join(tmp_dir, name), 'wb') as f:
+                    f.write(content)
+
+            # path
+            nodes = MockParser(css='li').parse_file(os.path.join(tmp_dir, 'page.html'))
+            self.assertListEqual([node.text for node in nodes], ['č', 'b'])
+            self.assertEqual(len(MockParser(xpath='li').parse_file(os.path.join(tmp_dir, 'feed.xml'))), 1)
+            self.assertEqual(len(MockParser(css='li').parse_file(os.path.join(tmp_dir, 'empty.html'))), 0)
+
+        # file object
+        nodes = MockParser(css='li').parse_file(BytesIO(html))
+        self.assertListEqual([node.text for node in nodes], ['č', 'b'])
+        self.assertEqual(len(MockParser(xpath='li').parse_file(BytesIO(xml))), 1)
+        self.assertEqual(len(MockParser(xpath='li').parse_file(BytesIO(b' \n '))), 0)
+        nodes = MockParser(css='li').parse_file(BytesIO('<li>č</li>'.encode('iso-8859-2')), encoding='iso-8859-2')
+        self.assertEqual(nodes[0].text, 'č')
+
+    def test_parse_file_without_root(self):
+        for body in (b'<!-- c -->', b'<?xml version="1.0"?>'):
+            self.assertListEqual(MockParser(css='p').parse_file(BytesIO(body)), [])
+            self.assertListEqual(MockParser(css='p').parse(body), [])
+
+    def test_feed_session(self):
+        html = ('<ul>%s</ul>' % ''.join('<li>č%d</li>' % i for i in range(500))).encode('utf-8')
+        xml = b'\n <?xml version="1.0" encoding="UTF-8"?><ul>' + b'<li>a</li>' * 500 + b'</ul>'
+        for body, xpath in ((html, '//li'), (xml, 'li')):
+            for chunk_size in (1, 7, 4096):
+                session = MockParser(xpath=xpath).feed_session()
+                for i in range(0, len(body), chunk_size):
+                    session.feed(memoryview(body)[i:i + chunk_size])
+                nodes = session.close()
+                self.assertListEqual([node.text for node in nodes],
+                                     [node.text for node in MockParser(xpath=xpath).parse(body)])
+
+        session = MockParser(css='li').feed_session(encoding='iso-8859-2')
+        session.feed('<li>č</li>'.encode('iso-8859-2'))
+        self.assertEqual(session.close()[0].text, 'č')
+
+        # empty document
+        session = MockParser(css='li').feed_session()
+        session.feed(b'  ')
+        self.assertListEqual(session.close(), [])
+        self.assertRaises(ValueError, session.feed, b'<li>a</li>')
+        self.assertRaises(ValueError, session.close)
+
+    def test_parser_options(self):
+        html = '<ul><!-- comment --><li>a</li></ul>'
+        xml = '<?xml version="1.0"?>' + html
+        comments = MockParser(xpath='//comment()')
+        self.assertEqual(len(comments.parse(html)), 1)
+        self.assertListEqual(comments.parse(html, remove_comments=True), [])
+        self.assertListEqual(comments.parse(xml, remove_comments=True), [])
+        self.assertListEqual(comments.parse_html(html, remove_comments=True), [])
+        self.assertListEqual(comments.parse_xml(html, remove_comments=True), [])
+        self.assertListEqual(comments.parse_file(BytesIO(html.encode('utf-8')), remove_comments=True), [])
+
+        session = comments.feed_session(remove_comments=True)
+        session.feed(html.encode('utf-8'))
+        self.assertListEqual(session.close(), [])
+
+        self.assertRaises(TypeError, comments.parse, html, recover=False)
+        self.assertRaises(TypeError, comments.feed_session, recover=False)
+
     def test_xml_extraction(self):
         xml = '''
         <?xml version="1.0" encoding="UTF-8"?>
@@ -103,7 +240,7 @@ class TestParser(TestBaseParser):
 
 class MockNamedParser(BaseNamedParser):
     def _process_named_nodes(self, nodes, context):
-        return [node.extract() for node in nodes]
+        return [etree.tostring(node, encoding=str) for node in nodes]
 
 
 class TestBaseNamedParser(TestBaseParser):
@@ -164,9 +301,29 @@ class TestString(TestBaseNamedParser):
 
         self.assertEqual(String(name='val', css='span', count=1, attr='_text').parse(html)['val'], 'Hello !')
         self.assertEqual(String(name='val', css='span', count=1, attr='_all_text').parse(html)['val'], 'Hello world!')
+        self.assertEqual(String(name='val', css='span', count=1, attr='_normalized_text').parse(html)['val'], 'Hello world!')
         self.assertEqual(String(name='val', css='span', count=1, attr='data-val').parse(html)['val'], 'rocks')
         self.assertEqual(String(name='val', css='span', count=1, attr='data-invalid').parse(html)['val'], '')
 
+    def test_all_text(self):
+        html = '<div>\n  Hello <b>big <i>wide</i></b>\t<!-- comment --> world  <script>x</script>\n</div><p></p>'
+        # same as joining all the descendant text nodes
+        expected = [''.join(node.xpath('descendant-or-self::*/text()'))
+                    for node in HtmlXPathExtractor(html)._root.xpath('//div | //p')]
+        self.assertListEqual(String(css='div, p', attr='_all_text').parse(html), expected)
+        self.assertListEqual(String(css='div, p', attr='_normalized_text').parse(html),
+                             ['Hello big wide world x', ''])
+        # matched text nodes have no text content of their own
+        self.assertListEqual(String(xpath='//b/text() | //p', attr='_normalized_text').parse(html), ['', ''])
+
+    def test_compile(self):
+        html = '<span data-val="rocks">Hello <b>world</b>!</span>'
+        parser = String(css='span', count=1, attr='_all_text')
+        self.assertIs(parser.compile(), parser)
+        self.assertIsInstance(parser.compiled_xpath, etree.XPath)
+        self.assertIsInstance(parser.compiled_attr, etree.XPath)
+        self.assertEqual(parser.parse(html), 'Hello world!')
+
     def test_callback(self):
         html = '<span>1</span><span>2</span>'
         self.assertListEqual(String(css='span').parse(html), ['1', '2'])
@@ -174,6 +331,24 @@ class TestString(TestBaseNamedParser):
         self.assertEqual(String(css='span:first-child', callback=int, count=1).parse(html), 1)
         self.assertListEqual(String(css='div', callback=int).parse(html), [])
 
+    def test_batch_callback(self):
+        html = '<span>1</span><span>2</span>'
+        batches = []
+
+        def to_ints(values):
+            batches.append(list(values))
+            return [int(x) for x in values]
+
+        self.assertListEqual(String(css='span', batch_callback=to_ints).parse(html), [1, 2])
+        self.assertEqual(String(css='span:first-child', batch_callback=to_ints, count=1).parse(html), 1)
+        self.assertListEqual(String(css='div', batch_callback=to_ints).parse(html), [])
+        self.assertIsNone(String(css='div', batch_callback=to_ints, count='?').parse(html))
+        # called once per parser run
+        self.assertListEqual(batches, [['1', '2'], ['1'], [], []])
+
+        self.assertRaises(ParserError, String, css='span', callback=int, batch_callback=to_ints)
+        self.assertRaises(ParsingError, String(css='span', batch_callback=lambda values: values[:1]).parse, html)
+
 
 class TestUrl(TestBaseNamedParser):
     parser_class = Url
@@ -188,6 +363,28 @@ class TestUrl(TestBaseNamedParser):
         self.assertEqual(Url(name='val', css='a', count=1, attr='data-val').parse(html)['val'], '/val')
         self.assertEqual(Url(name='val', css='a', count=1, attr='data-val').parse(html, url='http://example.com/a/b/c')['val'], 'http://example.com/val')
 
+    def test_resolve(self):
+        html = '''
+            <a href="/test"></a> <a href=" /test "></a> <a href="test"></a> <a href="/test"></a>
+            <a href=""></a> <a href="http://[::1"></a> <a href="https://other.com/?a=b#c"></a>
+            <a href="//cdn.com/a.js"></a> <a href="../up;p?"></a>'''
+        base_url = 'http://example.com/a/b/c?q=1'
+        hrefs = ['/test', ' /test ', 'test', '/test', '', 'http://[::1', 'https://other.com/?a=b#c',
+                 '//cdn.com/a.js', '../up;p?']
+        expected = []
+        for href in hrefs:
+            try:
+                expected.append(urljoin(base_url, href.strip()))
+            except ValueError:
+                expected.append(href.strip())
+
+        self.assertListEqual(Url(css='a').parse(html, url=base_url), expected)
+        # memoized urls are shared by all the parsers in the document
+        context = {'url': base_url}
+        parser = Prefix(children=[Url(name='a', css='a'), Url(name='b', css='a[href="test"]')])
+        parser._parse(HtmlXPathExtractor(html)._root, context)
+        self.assertEqual(context['resolved_urls']['test'], 'http://example.com/a/b/test')
+
     def test_callback(self):
         def _parse_scheme(url):
             return urlparse(url).scheme
@@ -195,6 +392,17 @@ class TestUrl(TestBaseNamedParser):
         self.assertEqual(Url(css='a', count=1, callback=_parse_scheme).parse(html), '')
         self.assertEqual(Url(css='a', count=1, callback=_parse_scheme).parse(html, url='http://example.com/a/b/c'), 'http')
 
+    def test_intern(self):
+        html = '<a href="/test"></a>'
+        parser = Url(css='a', count=1, intern=True)
+        # resolved urls are interned, so they are shared across the documents
+        first = parser.parse(html, url='http://example.com/a')
+        self.assertEqual(first, 'http://example.com/test')
+        self.assertIs(parser.parse(html, url='http://example.com/b'), first)
+        self.assertIs(parser.parse(html), sys.intern('/test'))
+        # non-string values are left alone
+        self.assertEqual(DateTime(css='a', count=1, format='%Y', intern=True).parse('<a>2020</a>'), datetime(2020, 1, 1))
+
 
 class TestDateTime(TestBaseNamedParser):
     parser_class = DateTime
@@ -213,6 +421,11 @@ class TestDateTime(TestBaseNamedParser):
         # invalid format
         self.assertRaises(ValueError, DateTime(name='val', css='span', count=1, format='%d').parse, html)
 
+    def test_convert_values(self):
+        parser = DateTime(format='%Y-%m-%dT%H:%M')
+        self.assertListEqual(parser.convert_values(['2015-11-24T10:12', '2015-11-24T10:12']),
+                             [datetime(2015, 11, 24, 10, 12)] * 2)
+
     def test_callback(self):
         def _get_day(dt):
             return dt.day
@@ -239,6 +452,10 @@ class TestDate(TestBaseNamedParser):
         # invalid format
         self.assertRaises(ValueError, Date(name='val', css='span', count=1, format='%d').parse, html)
 
+    def test_convert_values(self):
+        parser = Date(format='%Y-%m-%d')
+        self.assertListEqual(parser.convert_values(['2015-11-24']), [date(2015, 11, 24)])
+
     def test_callback(self):
         def _get_day(dt):
             return dt.day
@@ -275,6 +492,32 @@ class TestElement(TestBaseNamedParser):
         val = Element(xpath='//span/@class', count=1).parse(html)
         self.assertEqual(val, 'nice')
 
+    def test_detach(self):
+        html = '<div><span class="nice">Hello <b>world</b></span>!</div>'
+        val = Element(css='span', count=1, detach=True).parse(html)
+        self.assertEqual(etree.tostring(val), b'<span class="nice">Hello <b>world</b></span>')
+        self.assertIsNone(val.getparent())
+        self.assertIs(val.getroottree().getroot(), val)
+        self.assertIsNotNone(Element(css='span', count=1).parse(html).getparent())
+
+        # plain strings don't reference the tree
+        val = Element(xpath='//span/text() | //span/@class', detach=True).parse(html)
+        self.assertListEqual(val, ['nice', 'Hello '])
+        self.assertTrue(all(type(x) is str for x in val))
+        self.assertEqual(Element(xpath='count(//b)', count=1, detach=True).parse(html), 1)
+
+        val = Element(css='b', count=1, detach=True, callback=lambda el: el.getparent()).parse(html)
+        self.assertIsNone(val)
+
+    def test_quantity_error(self):
+        html = '<ul>%s</ul>' % ''.join('<li>%s</li>' % i for i in range(100))
+        with self.assertRaisesRegex(ParsingError, 'matched 100 elements'):
+            Element(css='li', count=(0, 3)).parse(html)
+        with self.assertRaisesRegex(ParsingError, 'matched 1 elements'):
+            Element(xpath='count(//li)', count=0).parse(html)
+        self.assertEqual(Element(xpath='string(//li[2])', count=1).parse(html), '1')
+        self.assertListEqual(Element(xpath='count(//li) > 10', count=(0, 2)).parse(html), [True])
+
 
 class TestGroup(TestBaseNamedParser):
     parser_class = Group
@@ -316,12 +559,197 @@ class TestGroup(TestBaseNamedParser):
         ]).parse(self.html, url='http://example.com/')
         self.assertDictEqual(val, extracted)
 
+    def test_compile(self):
+        child = String(name='name', css='span', count=1)
+        parser = Group(css='li', count=2, children=[child]).compile()
+        self.assertTrue(hasattr(parser._compiled, 'xpath'))
+        self.assertTrue(hasattr(child._compiled, 'xpath'))
+        self.assertTrue(hasattr(child._compiled, 'attr'))
+        self.assertListEqual(parser.parse(self.html), [{'name': 'Mike'}, {'name': 'John'}])
+
+    def test_output(self):
+        children = [
+            String(name='name', css='span', count=1, intern=True),
+            Prefix(css='a', children=[Url(name='link', count='?')])]
+        for output in ['namedtuple', 'slots']:
+            parser = Group(css='li', count=2, output=output, children=children).compile()
+            self.assertTupleEqual(parser.fields, ('name', 'link'))
+            records = parser.parse(self.html, url='http://example.com/')
+            self.assertListEqual([(record.name, record.link) for record in records],
+                                 [('Mike', None), ('John', 'http://example.com/test')])
+            self.assertIs(type(records[0]), type(records[1]))
+            self.assertIs(records[0].name, sys.intern('Mike'))
+
+            val = Group(name='val', css='li', count=2, output=output, children=children,
+                        callback=lambda record: record._asdict()).parse(self.html)
+            self.assertDictEqual(dict(val['val'][0]), {'name': 'Mike', 'link': None})
+
+        self.assertRaises(ParserError, Group, css='li', output='list', children=[])
+        self.assertRaises(ParserError, Group, css='li', output='slots', children=[String(name='data-id')])
+        self.assertRaises(ParserError, Group, css='li', output='slots', children=[
+            Prefix(css='a', children=[String(name='name')], callback=len)])
+
+    def test_columns(self):
+        html = '<ul><li><span>Mike</span><i>1</i><b>1.1.2020</b></li><li><span>John</span><i>2</i></li></ul>'
+        children = [
+            String(name='name', css='span', count=1),
+            Prefix(css='i', children=[String(name='id', count='?', callback=int)]),
+            Date(name='date', css='b', count='?', format='%d.%m.%Y')]
+        columns = Group(css='li', output='columns', children=children).parse(html)
+        self.assertDictEqual(columns, {'name': ['Mike', 'John'], 'id': [1, 2], 'date': [date(2020, 1, 1), None]})
+        # callback is called with the whole table
+        val = Group(name='val', css='li', output='columns', callback=lambda columns: columns['name'],
+                    children=children).parse(html)
+        self.assertDictEqual(val, {'val': ['Mike', 'John']})
+        self.assertDictEqual(Group(css='ol', output='columns', children=children).parse(html),
+                             {'name': [], 'id': [], 'date': []})
+
+    @unittest.skipUnless(numpy_available(), 'numpy is not installed')
+    def test_arrays(self):
+        html = '<ul><li><span>Mike</span><i>1</i><b>1.1.2020</b></li><li><span>John</span><i>2</i></li></ul>'
+        arrays = Group(css='li', output='arrays', children=[
+            String(name='name', css='span', count=1),
+            String(name='id', css='i', count=1, callback=int),
+            Date(name='date', css='b', count='?', format='%d.%m.%Y')]).parse(html)
+        self.assertListEqual(arrays['name'], ['Mike', 'John'])
+        self.assertEqual(str(arrays['id'].dtype), 'int64')
+        self.assertListEqual(arrays['id'].tolist(), [1, 2])
+        self.assertEqual(str(arrays['date'].dtype), 'datetime64[D]')
+        self.assertListEqual([str(value) for value in arrays['date']], ['2020-01-01', 'NaT'])
+
+        # post-processed dates don't have to be dates any more
+        arrays = Group(css='li', output='arrays', children=[
+            Date(name='day', css='b', count='?', format='%d.%m.%Y',
+                 batch_callback=lambda values: [value and value.strftime('%A') for value in values])]).parse(html)
+        self.assertListEqual(arrays['day'], ['Wednesday', None])
+
+    def test_shared_prefix(self):
+        html = '''
+            <div class="item">
+                <div class="price"><span>10</span><meta content="EUR"></div>
+                <a href="/a">a</a>
+            </div>
+            <div class="item">
+                <div class="price"><span>20</span>
+                    <div class="price"><span>30</span><meta content="USD"></div>
+                </div>
+            </div>'''
+
+        def build_children():
+            return [
+                String(name='price', css='.price span'),
+                String(name='currency', css='.price meta', attr='content'),
+                String(name='first', css='.price > span:first-child', count='+'),
+                Element(name='parent', xpath=css_to_xpath('.price') + '/../@class'),
+                Url(name='link', css='a', count='?')]
+
+        children = build_children()
+        parser = Group(css='.item', children=children)
+        self.assertListEqual(
+            [shared_prefix.prefix for shared_prefix in parser.compiled_shared_prefixes],
+            [css_to_xpath('.price')])
+        expected = [
+            {'price': ['10'], 'currency': ['EUR'], 'first': ['10'], 'parent': ['item'], 'link': '/a'},
+            # nested prefix nodes
+            {'price': ['20', '30'], 'currency': ['USD'], 'first': ['20', '30'], 'parent': ['item', 'price'], 'link': None}]
+        self.assertListEqual(parser.parse(html), expected)
+        self.assertDictEqual(
+            Prefix(css='.item', children=build_children()[:2]).parse(html),
+            {'price': ['10', '20', '30'], 'currency': ['EUR', 'USD']})
+
     def test_callback(self):
         val = Group(css='li', count=2, callback=lambda d: d['name'], children=[
             String(name='name', css='span', count=1),
         ]).parse(self.html)
         self.assertListEqual(val, ['Mike', 'John'])
 
+    def test_batch_callback(self):
+        batches = []
+
+        def names(records):
+            batches.append(len(records))
+            return [record.name for record in records]
+
+        val = Group(css='li', output='namedtuple', batch_callback=names, children=[
+            String(name='name', css='span', count=1),
+        ]).parse(self.html)
+        self.assertListEqual(val, ['Mike', 'John'])
+        self.assertListEqual(batches, [2])
+
+        val = Group(css='li', output='columns', batch_callback=lambda tables: [tables[0]['name']], children=[
+            String(name='name', css='span', count=1),
+        ]).parse(self.html)
+        self.assertListEqual(val, ['Mike', 'John'])
+
+
+class TestGroupIterparse(unittest.TestCase):
+    xml = b'''<?xml version="1.0" encoding="UTF-8"?>
+        <feed>
+            <item id="1"><title>First</title><link>/first</link></item>
+            <item id="2"><title>Second</title><link>/second</link></item>
+            <other><item id="3"><title>Third</title></item></other>
+        </feed>'''
+
+    def test_basic(self):
+        parser = Group(children=[
+            String(name='id', attr='id', count=1),
+            String(name='title', xpath='title', count=1),
+            Url(name='link', xpath='link', attr='_text', count='?')
+        ])
+        records = list(parser.iterparse(BytesIO(self.xml), tag='item', url='http://example.com/'))
+        self.assertListEqual(records, [
+            {'id': '1', 'title': 'First', 'link': 'http://example.com/first'},
+            {'id': '2', 'title': 'Second', 'link': 'http://example.com/second'},
+            {'id': '3', 'title': 'Third', 'link': None}])
+
+    def test_callback(self):
+        parser = Group(callback=lambda d: d['title'], children=[
+            String(name='title', xpath='title', count=1)
+        ])
+        self.assertListEqual(list(parser.iterparse(BytesIO(self.xml), tag='item')),
+                             ['First', 'Second', 'Third'])
+
+        parser = Group(batch_callback=lambda records: [r['title'] for r in records], children=[
+            String(name='title', xpath='title', count=1)
+        ])
+        self.assertListEqual(list(parser.iterparse(BytesIO(self.xml), tag='item')),
+                             ['First', 'Second', 'Third'])
+
+    def test_columns(self):
+        parser = Group(output='columns', children=[String(name='title', xpath='title', count=1)])
+        self.assertRaisesRegex(ParserError, r'not supported by iterparse', parser.iterparse,
+                               BytesIO(self.xml), tag='item')
+        parser = Group(output='namedtuple', children=[String(name='title', xpath='title', count=1)])
+        self.assertListEqual([r.title for r in parser.iterparse(BytesIO(self.xml), tag='item')],
+                             ['First', 'Second', 'Third'])
+
+    def test_context_per_record(self):
+        memo_sizes = []
+
+        class MemoUrl(Url):
+            def _process_values(self, values, context):
+                result = super(MemoUrl, self)._process_values(values, context)
+                memo_sizes.append(len(context['resolved_urls']))
+                return result
+
+        parser = Group(children=[MemoUrl(name='link', xpath='link', attr='_text', count='?')])
+        records = list(parser.iterparse(BytesIO(self.xml), tag='item', url='http://example.com/'))
+        self.assertEqual(records[1]['link'], 'http://example.com/second')
+        # memo of the resolved urls doesn't grow with the stream
+        self.assertListEqual(memo_sizes, [1, 1, 0])
+
+    def test_clear_processed(self):
+        parser = Group(children=[
+            Element(name='element', count=1),
+            String(name='title', xpath='title', count=1)
+        ])
+        records = list(parser.iterparse(BytesIO(self.xml), tag='item'))
+        self.assertListEqual([r['title'] for r in records], ['First', 'Second', 'Third'])
+        for record in records:
+            # processed elements are cleared and removed from the tree
+            self.assertEqual(len(record['element']), 0)
+        self.assertIsNone(records[0]['element'].getparent())
+
 
 class TestPrefix(TestBaseParser):
     parser_class = Prefix
@@ -356,3 +784,78 @@ class TestPrefix(TestBaseParser):
             String(name='name', css='span', count=2),
         ]).parse(self.html)
         self.assertListEqual(val, ['Mike', 'John'])
+
+
+class TestParserSet(unittest.TestCase):
+    html = '''
+        <h1>Title</h1>
+        <div class="product"><span>Mike</span><a href="/mike">link</a></div>
+        <div class="product"><span>John</span></div>'''
+
+    def build_parsers(self):
+        return {
+            'title': String(css='h1', count=1),
+            'names': Group(css='.product', children=[String(name='name', css='span', count=1)]),
+            'links': Prefix(css='.product', children=[Url(name='link', css='a')]),
+            'count': Element(css='.product', callback=lambda el: el.tag),
+        }
+
+    def test_build(self):
+        self.assertRaisesRegex(ParserError, r'at least one parser', ParserSet)
+        self.assertRaisesRegex(ParserError, r'accepts only parsers', ParserSet, title='h1')
+
+    def test_basic(self):
+        parsers = self.build_parsers()
+        expected = dict((name, parser.parse(self.html, url='http://example.com/'))
+                        for name, parser in parsers.items())
+        self.assertDictEqual(ParserSet(parsers).parse(self.html, url='http://example.com/'), expected)
+        self.assertDictEqual(ParserSet(**parsers).compile().parse_html(self.html, url='http://example.com/'), expected)
+
+    def test_shared_selectors(self):
+        evaluated = []
+
+        class TracingGroup(Group):
+            def _select(self, nodes):
+                evaluated.append(self.raw_xpath)
+                return super(TracingGroup, self)._select(nodes)
+
+        parser_set = ParserSet(
+            a=TracingGroup(css='.product', children=[String(name='name', css='span', count=1)]),
+            b=TracingGroup(css='.product', children=[Url(name='link', css='a', count='?')]),
+            c=TracingGroup(css='h1', children=[String(name='title', count=1)]))
+        val = parser_set.parse(self.html)
+        self.assertEqual(len(evaluated), 2)
+        self.assertListEqual(val['a'], [{'name': 'Mike'}, {'name': 'John'}])
+        self.assertListEqual(val['b'], [{'link': '/mike'}, {'link': None}])
+        self.assertListEqual(val['c'], [{'title': 'Title'}])
+
+    def test_shared_prefix(self):
+        html = '''
+            <div class="product"><span class="price">10</span></div>
+            <div class="product"><span class="price">20</span>
+                <div class="product"><span class="price">30</span></div>
+            </div>'''
+        parsers = {
+            'names': Group(css='.product', children=[String(name='price', css='.price')]),
+            'prices': String(css='.product .price'),
+            'first': String(css='.product > .price:first-child'),
+            'same': String(css='.product .price'),
+            'title': String(css='h1', count='?'),
+        }
+        parser_set = ParserSet(parsers)
+        distinct, shared_prefixes = parser_set.compiled_selectors
+        self.assertEqual(len(distinct), 4)
+        self.assertListEqual([shared_prefix.prefix for shared_prefix in shared_prefixes], [css_to_xpath('.product')])
+        expected = dict((name, parser.parse(html)) for name, parser in parsers.items())
+        self.assertListEqual(expected['prices'], ['10', '20', '30'])
+        self.assertDictEqual(parser_set.parse(html), expected)
+        with ParserStats():
+            self.assertDictEqual(parser_set.parse(html), expected)
+
+    def test_nested(self):
+        parser_set = ParserSet(title=String(css='h1', count=1), products=ParserSet(
+            names=String(css='.product span'), links=Url(css='.product a')))
+        self.assertDictEqual(parser_set.parse(self.html), {
+            'title': 'Title', 'products': {'names': ['Mike', 'John'], 'links': ['/mike']}})
+        with ParserStats():
+            self.assertDictEqual(parser_set.parse(self.html), parser_set.parse(self.html))
@@ -0,0 +1,65 @@
+from datetime import datetime
+import pickle
+import unittest
+
+from xextract.records import is_valid_field, numpy_available, record_class, to_arrays
+
+
+class TestRecords(unittest.TestCase):
+    def test_namedtuple(self):
+        cls = record_class('namedtuple', ('name', 'price'))
+        self.assertIs(record_class('namedtuple', ('name', 'price')), cls)
+        record = cls('Book', '10')
+        self.assertEqual(record.name, 'Book')
+        self.assertEqual(record, ('Book', '10'))
+        self.assertDictEqual(dict(record._asdict()), {'name': 'Book', 'price': '10'})
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_slots(self):
+        cls = record_class('slots', ('name', 'price'))
+        self.assertIs(record_class('slots', ('name', 'price')), cls)
+        record = cls('Book', '10')
+        self.assertEqual((record.name, record.price), ('Book', '10'))
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertRaises(AttributeError, setattr, record, 'other', 1)
+        self.assertDictEqual(record._asdict(), {'name': 'Book', 'price': '10'})
+        self.assertListEqual(list(record), ['Book', '10'])
+        self.assertEqual(repr(record), "Record(name='Book', price='10')")
+
+        unpickled = pickle.loads(pickle.dumps(record))
+        self.assertIs(type(unpickled), cls)
+        self.assertEqual(unpickled, record)
+        self.assertNotEqual(cls('Book', '11'), record)
+        self.assertNotEqual(record_class('slots', ('title', 'price'))('Book', '10'), record)
+
+        self.assertEqual(list(record_class('slots', ())()), [])
+
+    def test_is_valid_field(self):
+        for name in ['name', 'price2', 'self']:
+            self.assertTrue(is_valid_field(name), name)
+        for name in ['data-id', '2nd', 'class', '_private', '', 1]:
+            self.assertFalse(is_valid_field(name), name)
+
+
+@unittest.skipUnless(numpy_available(), 'numpy is not installed')
+class TestToArrays(unittest.TestCase):
+    def test_to_arrays(self):
+        arrays = to_arrays({
+            'created': [datetime(2020, 1, 2, 3, 4, 5), None],
+            'count': [1, 2],
+            'price': [1, 2.5],
+            'available': [True, False],
+            'name': ['a', 'b'],
+            'maybe': [1, None],
+            'huge': [2 ** 70, 1],
+            'empty': [],
+        }, {'created': 'datetime64[us]'})
+
+        self.assertEqual(str(arrays['created'].dtype), 'datetime64[us]')
+        self.assertEqual(str(arrays['created'][0]), '2020-01-02T03:04:05.000000')
+        self.assertEqual(str(arrays['created'][1]), 'NaT')
+        self.assertEqual(str(arrays['count'].dtype), 'int64')
+        self.assertEqual(str(arrays['price'].dtype), 'float64')
+        self.assertEqual(str(arrays['available'].dtype), 'bool')
+        for name in ['name', 'maybe', 'huge', 'empty']:
+            self.assertIsInstance(arrays[name], list, name)
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from xextract import selectors
+from xextract.parsers import String
+from xextract.selectors import css_to_xpath, load_css_cache, save_css_cache, clear_css_cache
+
+
+class TestCssToXpath(unittest.TestCase):
+    def setUp(self):
+        clear_css_cache()
+
+    def tearDown(self):
+        clear_css_cache()
+
+    def test_translate(self):
+        self.assertEqual(css_to_xpath('ul > li'), 'descendant-or-self::ul/li')
+        self.assertEqual(String(css='ul > li').raw_xpath, 'descendant-or-self::ul/li')
+        self.assertIn('ul > li', selectors._cache)
+
+    def test_bounded(self):
+        original_size = selectors.CSS_CACHE_SIZE
+        selectors.CSS_CACHE_SIZE = 2
+        try:
+            css_to_xpath('a')
+            css_to_xpath('b')
+            css_to_xpath('a')  # `a` is now the most recently used
+            css_to_xpath('c')
+            self.assertListEqual(list(selectors._cache), ['a', 'c'])
+        finally:
+            selectors.CSS_CACHE_SIZE = original_size
+
+    def test_persistent_cache(self):
+        css_to_xpath('ul > li')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'css.json')
+            save_css_cache(path)
+            clear_css_cache()
+            self.assertEqual(load_css_cache(path), 1)
+            self.assertEqual(selectors._cache['ul > li'], 'descendant-or-self::ul/li')
+            # missing file is ignored
+            self.assertEqual(load_css_cache(os.path.join(tmp_dir, 'missing.json')), 0)
+
+    def test_lazy_import(self):
+        code = '\n'.join([
+            'import sys',
+            'from xextract import String',
+            'String(xpath="//a").parse("<a>1</a>")',
+            'assert "cssselect" not in sys.modules',
+            'String(css="a")',
+            'assert "cssselect" in sys.modules'])
+        subprocess.check_call([sys.executable, '-c', code])
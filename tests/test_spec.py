@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+from xextract.parsers import (
+    ParserError, Prefix, Group, Element, String, Url, DateTime, Date, ParserSet)
+from xextract.spec import from_spec, load_spec, save_spec, to_spec, callback_path, resolve_callback
+
+
+def parse_price(value):
+    return float(value)
+
+
+class CustomString(String):
+    pass
+
+
+def build_parser():
+    return ParserSet(
+        title=String(css='h1', count=1, callback=str.strip),
+        products=Group(css='.product', output='slots', children=[
+            String(name='price', css='.price', count=1, callback=parse_price, intern=True),
+            Prefix(css='.title', children=[
+                Url(name='link', css='a', count='?'),
+                String(name='name', attr='_normalized_text', count=1)]),
+            DateTime(name='created', css='time', attr='datetime', format='%Y-%m-%d', count=(0, 1)),
+            Date(name='updated', css='time', format='%d.%m.%Y', count='?'),
+            Element(name='img', css='img', count='?', callback=len),
+            CustomString(name='custom', css='.price', count=1),
+        ]))
+
+
+HTML = '''
+    <h1> Products </h1>
+    <div class="product">
+        <span class="price">10.5</span>
+        <h2 class="title"><a href="/product/1">Nice <b>product</b></a></h2>
+        <time datetime="2020-01-02">3.4.2020</time>
+    </div>'''
+
+
+class TestSpec(unittest.TestCase):
+    def test_round_trip(self):
+        parser = build_parser()
+        spec = json.loads(json.dumps(parser.to_spec()))
+        rebuilt = from_spec(spec)
+        self.assertDictEqual(to_spec(rebuilt), spec)
+        self.assertEqual(rebuilt.parse(HTML, url='http://example.com/'), parser.parse(HTML, url='http://example.com/'))
+
+    def test_spec(self):
+        spec = String(css='h1', count=(1, 2), callback=parse_price, namespaces={'a': 'http://a.com/'}).to_spec()
+        self.assertDictEqual(spec, {
+            'type': 'String', 'xpath': 'descendant-or-self::h1', 'namespaces': {'a': 'http://a.com/'},
+            'name': None, 'count': (1, 2), 'callback': 'tests.test_spec.parse_price', 'batch_callback': None,
+            'attr': '_text', 'intern': False})
+        self.assertEqual(build_parser().to_spec()['parsers']['products']['children'][-1]['type'],
+                         'tests.test_spec.CustomString')
+
+    def test_callback_path(self):
+        self.assertEqual(callback_path(parse_price), 'tests.test_spec.parse_price')
+        self.assertEqual(callback_path(int), 'builtins.int')
+        self.assertEqual(callback_path(str.strip), 'builtins.str.strip')
+        self.assertEqual(callback_path(os.path.join), 'posixpath.join' if os.name == 'posix' else 'ntpath.join')
+        self.assertIs(resolve_callback('tests.test_spec.parse_price'), parse_price)
+        self.assertRaises(ParserError, callback_path, lambda x: x)
+        self.assertRaises(ParserError, String(callback=lambda x: x).to_spec)
+        self.assertRaises(ParserError, resolve_callback, 'tests.test_spec.missing')
+        self.assertRaises(ParserError, resolve_callback, 'missing_module.function')
+
+    def test_unknown_type(self):
+        self.assertRaises(ParserError, from_spec, {'type': 'Missing'})
+        self.assertRaises(ParserError, from_spec, {'type': 'ParserError'})
+        self.assertRaises(ParserError, from_spec, {'type': 'tests.test_spec.parse_price'})
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'parsers.json')
+            save_spec(path, {'shop': build_parser(), 'title': String(css='h1', count=1)})
+            parsers = load_spec(path)
+            self.assertListEqual(sorted(parsers), ['shop', 'title'])
+            self.assertEqual(parsers['title'].parse(HTML), ' Products ')
+            self.assertEqual(parsers['shop'].parse(HTML), build_parser().parse(HTML))
+
+            with open(path, 'w') as f:
+                json.dump({'version': 0, 'parsers': {}}, f)
+            self.assertRaises(ValueError, load_spec, path)
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from xextract import stats
+from xextract.parsers import Group, Prefix, String, Url, ParserSet
+from xextract.stats import ParserStats
+
+
+class TestParserStats(unittest.TestCase):
+    html = '''
+        <ul>
+            <li><span>Mike</span></li>
+            <li><span>John</span><a href="/john">link</a></li>
+        </ul>'''
+
+    def build_parser(self):
+        return Prefix(css='ul', children=[
+            Group(name='people', css='li', callback=dict, children=[
+                String(name='name', css='span', count=1),
+                Url(name='link', css='a', count='?')])])
+
+    def test_collect(self):
+        parser = self.build_parser()
+        with ParserStats() as collector:
+            for _ in range(3):
+                parser.parse(self.html)
+        data = collector.as_dict()
+
+        self.assertSetEqual(set(data), {
+            'Prefix(descendant-or-self::ul)',
+            'Prefix(descendant-or-self::ul)/Group(people)',
+            'Prefix(descendant-or-self::ul)/Group(people)/String(name)',
+            'Prefix(descendant-or-self::ul)/Group(people)/Url(link)'})
+
+        group = data['Prefix(descendant-or-self::ul)/Group(people)']
+        self.assertEqual(group['calls'], 3)
+        self.assertEqual(group['xpath_evaluations'], 3)
+        self.assertEqual(group['nodes_matched'], 6)
+        self.assertGreater(group['seconds'], 0)
+        self.assertGreater(group['callback_seconds'], 0)
+
+        link = data['Prefix(descendant-or-self::ul)/Group(people)/Url(link)']
+        self.assertEqual(link['calls'], 6)
+        self.assertEqual(link['xpath_evaluations'], 6)
+        self.assertEqual(link['nodes_matched'], 3)
+        self.assertEqual(link['callback_seconds'], 0)
+
+    def test_inactive(self):
+        parser = self.build_parser()
+        with ParserStats() as collector:
+            pass
+        parser.parse(self.html)
+        self.assertDictEqual(collector.as_dict(), {})
+        self.assertIsNone(stats._collector)
+
+    def test_nested(self):
+        parser = self.build_parser()
+        with ParserStats() as outer:
+            with ParserStats() as inner:
+                parser.parse(self.html)
+            self.assertIs(stats._collector, outer)
+        self.assertIsNone(stats._collector)
+        self.assertDictEqual(outer.as_dict(), {})
+        self.assertEqual(len(inner.as_dict()), 4)
+
+    def test_parser_set(self):
+        parser = ParserSet(
+            a=String(name='a', css='span'),
+            b=String(name='b', css='span'))
+        with ParserStats() as collector:
+            parser.parse(self.html)
+        data = collector.as_dict()
+        # the selector is evaluated only once for both parsers
+        self.assertEqual(data['String(a)']['xpath_evaluations'], 1)
+        self.assertEqual(data['String(b)']['xpath_evaluations'], 0)
+        self.assertEqual(data['String(b)']['nodes_matched'], 2)
+
+    def test_prometheus(self):
+        parser = String(name='na"me', css='span')
+        with ParserStats() as collector:
+            parser.parse(self.html)
+        text = collector.to_prometheus()
+        self.assertIn('# TYPE xextract_parser_calls_total counter\n', text)
+        self.assertIn('xextract_parser_calls_total{parser="String(na\\"me)"} 1\n', text)
+        self.assertIn('xextract_parser_nodes_matched_total{parser="String(na\\"me)"} 2\n', text)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'xextract.prom')
+            collector.to_prometheus(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), text)
@@ -0,0 +1,50 @@
+import unittest
+
+from xextract.selectors import css_to_xpath
+from xextract.xpath import join_steps, shared_prefix_length, split_steps
+
+
+class TestSplitSteps(unittest.TestCase):
+    def test_split(self):
+        cases = [
+            ('a', ['a']),
+            ('a/b', ['a', 'b']),
+            ('a//b[1]', ['a', 'descendant-or-self::node()', 'b[1]']),
+            ('self::*', ['self::*']),
+            ('./@href', ['.', '@href']),
+            ('../a/text()', ['..', 'a', 'text()']),
+            ('x:a/@y:b', ['x:a', '@y:b']),
+            ('a[contains(., "/")]/b[@c="]"]', ['a[contains(., "/")]', 'b[@c="]"]']),
+            ('descendant::div[count(preceding-sibling::*) = 1]/descendant::span',
+             ['descendant::div[count(preceding-sibling::*) = 1]', 'descendant::span']),
+        ]
+        for xpath, expected in cases:
+            steps = split_steps(xpath)
+            self.assertListEqual([step.text for step in steps], expected, xpath)
+            self.assertEqual(join_steps(steps).replace('/descendant-or-self::node()/', '//'), xpath)
+
+    def test_not_location_path(self):
+        for xpath in ['/a', '//a', 'a | b', 'a/b = "x"', 'count(a/b)', '(a/b)[1]', 'string()',
+                      'a[1', 'a]/b', '"a/b"', 'a/', '$var/a', 'a + b']:
+            self.assertIsNone(split_steps(xpath), xpath)
+
+    def test_downward(self):
+        downward = ['a', '.', '@href', 'text()', 'descendant::a', 'descendant-or-self::*', 'self::a', 'child::a[..]']
+        for xpath in downward:
+            self.assertTrue(split_steps(xpath)[0].is_downward, xpath)
+        for xpath in ['..', 'parent::*', 'ancestor::a', 'following-sibling::a', 'preceding::*']:
+            self.assertFalse(split_steps(xpath)[0].is_downward, xpath)
+
+
+class TestSharedPrefixLength(unittest.TestCase):
+    def test_shared_prefix_length(self):
+        def length(*xpaths):
+            return shared_prefix_length([split_steps(xpath) for xpath in xpaths])
+
+        self.assertEqual(length('a/b/c', 'a/b/d', 'a/b'), 2)
+        self.assertEqual(length('a/b/c', 'a/e/d'), 1)
+        self.assertEqual(length('a/b', 'c/b'), 0)
+        # trailing expansion steps are left to the suffixes
+        self.assertEqual(length('a//b', 'a//c'), 1)
+        self.assertEqual(length(css_to_xpath('.price span'), css_to_xpath('.price meta')), 1)
+        self.assertEqual(length('descendant-or-self::*/a', 'descendant-or-self::*/b'), 0)
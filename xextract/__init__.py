@@ -1,3 +1,6 @@
 from .parsers import *
+from .batch import *
+from .stats import *
+from .spec import *
 
 __version__ = '0.1.9'
@@ -0,0 +1,55 @@
+from collections import deque
+import asyncio
+
+
+__all__ = ['aparse', 'aparse_stream']
+
+
+async def aparse(parser, body, url=None, executor=None):
+    '''
+    Parse the document in the `executor` (the default executor of the event
+    loop, if not specified), so the event loop isn't blocked.
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, parser.parse, body, url)
+
+
+async def _iter_items(bodies):
+    if hasattr(bodies, '__aiter__'):
+        async for item in bodies:
+            yield item
+    else:
+        for item in bodies:
+            yield item
+
+
+async def aparse_stream(parser, bodies, executor=None, max_in_flight=8):
+    '''
+    Parse the documents from the (async) iterable `bodies` in the `executor`
+    and yield the results in the same order. Items of `bodies` are either
+    the documents or `(body, url)` pairs.
+
+    At most `max_in_flight` documents are parsed (or waiting to be parsed)
+    at once. Next document is not taken from `bodies` until the consumer
+    asks for the next result. When the stream is closed or the consuming task
+    is cancelled, the documents waiting in the executor are dropped.
+    '''
+    if max_in_flight < 1:
+        raise ValueError('Invalid max_in_flight: %s' % repr(max_in_flight))
+
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    try:
+        async for item in _iter_items(bodies):
+            if isinstance(item, tuple):
+                body, url = item
+            else:
+                body, url = item, None
+            pending.append(loop.run_in_executor(executor, parser.parse, body, url))
+            if len(pending) >= max_in_flight:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,156 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice, repeat
+import os
+import pickle
+
+
+__all__ = ['parse_many', 'parse_concurrent']
+
+
+# parser used by the current worker process, see `_init_worker()`
+_worker_parser = None
+
+
+def _init_worker(parser):
+    global _worker_parser
+    _worker_parser = parser.compile()
+
+
+def _parse_chunk(chunk, parser=None):
+    parser = parser or _worker_parser
+    return [(index, parser.parse(body, url)) for index, body, url in chunk]
+
+
+def _iter_chunks(bodies, urls, chunksize):
+    if chunksize < 1:
+        raise ValueError('Invalid chunksize: %s' % repr(chunksize))
+    if urls is None:
+        urls = repeat(None)
+    items = ((index, body, url) for index, (body, url) in enumerate(zip(bodies, urls)))
+    while True:
+        chunk = list(islice(items, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunks(executor, func, chunks, max_pending, ordered):
+    '''
+    Submit `func(chunk)` for every chunk to the `executor`, keeping at most
+    `max_pending` chunks in flight, and yield `(index, result)` pairs.
+    '''
+    if ordered:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= max_pending:
+                for item in pending.popleft().result():
+                    yield item
+        while pending:
+            for item in pending.popleft().result():
+                yield item
+    else:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(func, chunk))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for item in future.result():
+                        yield item
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for item in future.result():
+                    yield item
+
+
+def check_picklable(parser):
+    '''
+    Raise `ParserError`, if the parser can't be pickled and sent to the worker
+    processes, naming the callback responsible (e.g. a lambda).
+    '''
+    from .parsers import ParserError
+    from .stats import parser_label
+
+    try:
+        pickle.dumps(parser)
+    except Exception as e:
+        for sub_parser in _iter_parser_tree(parser):
+            for attr in ('callback', 'batch_callback'):
+                callback = getattr(sub_parser, attr, None)
+                if callback is not None and not _is_picklable(callback):
+                    raise ParserError(
+                        '%s %s of parser %s can\'t be pickled. '
+                        'Only module-level functions can be sent to the worker processes.' %
+                        (attr.replace('_', ' ').capitalize(), repr(callback), parser_label(sub_parser)))
+        raise ParserError('Parser %s can\'t be pickled: %s' % (parser_label(parser), e))
+
+
+def _iter_parser_tree(parser):
+    yield parser
+    children = list(getattr(parser, 'children', None) or [])
+    children.extend((getattr(parser, 'parsers', None) or {}).values())
+    for child in children:
+        for sub_parser in _iter_parser_tree(child):
+            yield sub_parser
+
+
+def _is_picklable(obj):
+    try:
+        pickle.dumps(obj)
+    except Exception:
+        return False
+    return True
+
+
+def parse_many(parser, bodies, urls=None, workers=None, chunksize=1, ordered=True):
+    '''
+    Parse the documents from `bodies` iterable with `parser` in a pool of
+    `workers` processes (defaults to the number of CPUs).
+
+    `urls` is an optional iterable of urls, one for each document.
+    Documents are sent to the workers in chunks of `chunksize` documents.
+    The parser is sent to every worker only once, when the worker starts,
+    so its callbacks must be picklable (module-level functions, not lambdas).
+    `ParserError` is raised right away, if they aren't.
+
+    If `ordered` is True, results are yielded in the same order as `bodies`.
+    Otherwise `(index, result)` pairs are yielded as soon as they are ready.
+    '''
+    check_picklable(parser)
+    chunks = _iter_chunks(bodies, urls, chunksize)
+    return _parse_many(parser, chunks, workers or os.cpu_count() or 1, ordered)
+
+
+def _parse_many(parser, chunks, workers, ordered):
+    # importing the executors is expensive, import them only when used
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(parser,)) as executor:
+        for index, result in _run_chunks(executor, _parse_chunk, chunks, 2 * workers, ordered):
+            yield result if ordered else (index, result)
+
+
+def parse_concurrent(parser, bodies, urls=None, max_workers=None):
+    '''
+    Parse the documents from `bodies` iterable with `parser` in a pool of
+    `max_workers` threads and yield the results in the same order as `bodies`.
+
+    libxml2 releases GIL while parsing the documents and evaluating xpaths,
+    so this is a cheap way of concurrency, when the callbacks are light.
+    Every thread compiles its own copies of the xpaths (see `BaseParser.compile()`),
+    when it parses its first document.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    chunks = _iter_chunks(bodies, urls, 1)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def func(chunk):
+        return _parse_chunk(chunk, parser)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        for _, result in _run_chunks(executor, func, chunks, 2 * max_workers, True):
+            yield result
@@ -0,0 +1,131 @@
+from datetime import datetime
+import re
+
+
+# patterns of the supported directives, same as the ones used by `datetime.strptime()`
+_directives = {
+    'Y': r'(?P<Y>\d\d\d\d)',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'd': r'(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+    'H': r'(?P<H>2[0-3]|[0-1]\d|\d)',
+    'M': r'(?P<M>[0-5]\d|\d)',
+    'S': r'(?P<S>6[0-1]|[0-5]\d|\d)',
+    'f': r'(?P<f>[0-9]{1,6})',
+}
+
+_whitespace_re = re.compile(r'\s+')
+
+
+def _escape_literal(literal):
+    # whitespace in the format matches any non-empty whitespace, like in `strptime()`
+    return r'\s+'.join(re.escape(part) for part in _whitespace_re.split(literal))
+
+
+def compile_format(format):
+    '''
+    Compile the `strptime()` format into a regex, if the format consists only
+    of the numeric directives %Y, %m, %d, %H, %M, %S, %f (and %%).
+    Otherwise return None.
+    '''
+    pattern = []
+    literal = []
+    i = 0
+    while i < len(format):
+        char = format[i]
+        if char != '%':
+            literal.append(char)
+            i += 1
+            continue
+        directive = format[i + 1:i + 2]
+        if directive == '%':
+            literal.append('%')
+        elif directive in _directives:
+            pattern.append(_escape_literal(''.join(literal)))
+            pattern.append(_directives[directive])
+            literal = []
+        else:
+            return None
+        i += 2
+    pattern.append(_escape_literal(''.join(literal)))
+
+    try:
+        return re.compile(''.join(pattern), re.IGNORECASE)
+    except re.error:  # e.g. repeated directive
+        return None
+
+
+class DateTimeConverter(object):
+    '''
+    Converts the strings into `datetime.datetime` objects, with the same results
+    as `datetime.strptime(value, format)`, but faster:
+
+    - numeric formats (e.g. "%Y-%m-%dT%H:%M:%S" or "%d.%m.%Y") are parsed
+      by a precompiled regex, instead of going through `strptime()` machinery
+    - converted values are memoized in a bounded cache of `cache_size` items,
+      since feeds tend to repeat the same dates over and over
+
+    Values not matched by the regex are passed to `strptime()`, so the
+    errors are the same as well.
+    '''
+
+    def __init__(self, format, cache_size=4096):
+        self.format = format
+        self.cache_size = cache_size
+        self._regex = compile_format(format)
+        self._cache = {}
+
+    def convert(self, value):
+        result = self._cache.get(value)
+        if result is None:
+            result = self._convert(value)
+            self._remember(value, result)
+        return result
+
+    def convert_many(self, values):
+        '''Convert the whole list of values.'''
+        cache = self._cache
+        convert = self._convert
+        results = []
+        for value in values:
+            result = cache.get(value)
+            if result is None:
+                result = convert(value)
+                self._remember(value, result)
+            results.append(result)
+        return results
+
+    def _remember(self, value, result):
+        cache = self._cache
+        if len(cache) >= self.cache_size:
+            # evict the oldest item
+            try:
+                del cache[next(iter(cache))]
+            except (KeyError, RuntimeError, StopIteration):  # modified by another thread
+                pass
+        cache[value] = result
+
+    def _convert(self, value):
+        if self._regex is not None:
+            match = self._regex.match(value)
+            # `strptime()` doesn't allow unconverted data at the end
+            if match is not None and match.end() == len(value):
+                found = match.groupdict()
+                fraction = found.get('f')
+                try:
+                    return datetime(
+                        int(found.get('Y') or 1900),
+                        int(found.get('m') or 1),
+                        int(found.get('d') or 1),
+                        int(found.get('H') or 0),
+                        int(found.get('M') or 0),
+                        int(found.get('S') or 0),
+                        int(fraction + '0' * (6 - len(fraction))) if fraction else 0)
+                except ValueError:
+                    pass  # let `strptime()` raise the error
+        return datetime.strptime(value, self.format)
+
+    def __getstate__(self):
+        # cached values are not worth pickling
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
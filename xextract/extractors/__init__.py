@@ -1,4 +1,5 @@
-__all__ = ['XPathExtractor', 'XmlXPathExtractor', 'HtmlXPathExtractor']
+__all__ = ['XPathExtractor', 'XmlXPathExtractor', 'HtmlXPathExtractor', 'DocumentCache', 'document_cache']
 
 
 from .lxml_extractor import XPathExtractor, XmlXPathExtractor, HtmlXPathExtractor
+from .cache import DocumentCache, document_cache
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import threading
+
+from .lxml_extractor import options_key
+
+
+class DocumentCache(object):
+    '''
+    LRU cache of parsed documents, so that many parsers run against the same
+    document don't pay for building the lxml tree again.
+
+    Documents are keyed by the extractor class (HTML or XML parsing), the
+    encoding, the lxml parser options and the content of the document.
+    Cache holds the documents, whose total length (in characters or bytes
+    of the source) is at most `max_size`. Setting `max_size` to 0 (default)
+    disables the cache.
+
+    Note that the cached trees are shared: if you modify the elements
+    returned by the parsers, the changes are visible to the other parsers.
+    '''
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()  # key -> (body, root), in the LRU order
+        self._lock = threading.Lock()
+
+    def get_root(self, extractor_class, body, encoding=None, **options):
+        '''
+        Return the root of the document parsed by `extractor_class`
+        with lxml parser `options`.
+        Mutable bodies (`bytearray`, writable `memoryview`) are never cached.
+        '''
+        size = len(body)
+        if size > self.max_size:  # also when the cache is disabled
+            return extractor_class(body, encoding=encoding, **options)._root
+
+        parser_options = options_key(options)
+        try:
+            key = (extractor_class, encoding, parser_options, type(body), hash(body))
+        except (TypeError, ValueError):  # unhashable
+            return extractor_class(body, encoding=encoding, **options)._root
+        with self._lock:
+            entry = self._entries.get(key)
+            # compare also the bodies, since the hashes can collide
+            if entry is not None and (entry[0] is body or entry[0] == body):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        root = extractor_class(body, encoding=encoding, **options)._root
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, root)
+            self._size += size
+            while self._size > self.max_size:
+                _, (evicted_body, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted_body)
+                self.evictions += 1
+        return root
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'documents': len(self._entries),
+                'size': self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+# process-wide cache used by `parse()`, `parse_html()` and `parse_xml()` methods of the parsers
+document_cache = DocumentCache()
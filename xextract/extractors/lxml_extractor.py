@@ -1,26 +1,289 @@
+import codecs
+import re
+import threading
+
 from lxml import etree
 
 from .extractor_list import XPathExtractorList
 
 
+# UTF-32 BOMs must go first, since BOM_UTF32_LE starts with BOM_UTF16_LE
+_boms = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+_non_space_re = re.compile(r'\S')
+_non_space_bytes_re = re.compile(br'\S')
+
+# encoding declared in the document itself, or the end of HTML head, which the declaration can't follow;
+# comments are matched only to be skipped, unterminated comment runs until the end of the scanned text
+_encoding_prescan_re = re.compile(
+    br'(?P<comment><!--(?:.*?-->|.*))'
+    br'|(?P<declared><meta[^>]+charset\s*=|<\?xml[^>]+encoding)'
+    br'|</head\s*>|<body[\s>]', re.IGNORECASE | re.DOTALL)
+SNIFF_LENGTH = 1024
+# how far the beginning of the document is looked for the declared encoding
+PRESCAN_LENGTH = 64 * 1024
+
+# encoding name -> its spelling known to libxml2 (None if unknown), see `libxml2_encoding()`
+_libxml2_encodings = {}
+
+# options of lxml parsers, which can be passed to the extractors
+PARSER_OPTIONS = ('remove_comments', 'remove_blank_text', 'huge_tree', 'no_network', 'collect_ids')
+
+# per-thread pool of lxml parsers, see `XPathExtractor._pooled_parser()`
+_parser_pool = threading.local()
+
+
+def options_key(options):
+    '''Validate the dictionary of lxml parser options and return its hashable representation.'''
+    for name in options:
+        if name not in PARSER_OPTIONS:
+            raise TypeError('Unknown parser option: %s.' % repr(name))
+    return tuple(sorted(options.items()))
+
+
+def sniff_bom(body):
+    '''Return the encoding given by the byte order mark of `body`, or None.'''
+    head = bytes(memoryview(body)[:4])
+    for bom, encoding in _boms:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def declares_encoding(head, complete=True):
+    '''
+    True, if the document starting with bytes `head` declares its encoding
+    (in the XML declaration or `<meta charset=...>` before the end of HTML
+    head), False, if it doesn't. None, if it can't be told yet, since `head`
+    is not the `complete` document and it's shorter than `PRESCAN_LENGTH`.
+
+    Only the first `PRESCAN_LENGTH` bytes are looked at, so that the result
+    doesn't depend on whether the whole document is available.
+    '''
+    for match in _encoding_prescan_re.finditer(head, 0, PRESCAN_LENGTH):
+        if match.group('comment') is None:
+            return match.group('declared') is not None
+    return False if complete or len(head) >= PRESCAN_LENGTH else None
+
+
+def prescan_done(head):
+    '''True, if the encoding of the document can be detected from its beginning `head`.'''
+    return looks_like_xml(head) or declares_encoding(head, complete=False) is not None
+
+
+def libxml2_encoding(encoding):
+    '''
+    Return the spelling of `encoding` known to libxml2 (which doesn't know
+    some of Python's spellings, e.g. "latin-1"), or None if libxml2 doesn't
+    support the encoding at all.
+    '''
+    try:
+        return _libxml2_encodings[encoding]
+    except KeyError:
+        pass
+
+    names = [encoding]
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        pass
+    else:
+        names.extend([name, name.replace('_', '-')])
+
+    result = None
+    for name in names:
+        try:
+            etree.XMLParser(encoding=name)
+        except LookupError:
+            continue
+        result = name
+        break
+    if len(_libxml2_encodings) < 1000:  # encodings come from the outside world, don't grow forever
+        _libxml2_encodings[encoding] = result
+    return result
+
+
+def looks_like_xml(body):
+    '''
+    True, if the document starts with the XML declaration.
+    Works on `str` as well as on the bytes-like objects, looking only at the
+    first 128 characters (or bytes) of the document.
+    '''
+    if isinstance(body, str):
+        return '<?xml' in body[:128]
+    head = bytes(memoryview(body)[:128])
+    encoding = sniff_bom(head)
+    if encoding is not None and encoding != 'utf-8':
+        head = head.decode(encoding, 'ignore').encode('ascii', 'ignore')
+    return b'<?xml' in head
+
+
+class _PeekedFile(object):
+    '''File object with its already read beginning put back.'''
+
+    def __init__(self, head, fileobj, complete=False):
+        self.head = head
+        self.complete = complete  # True, if `head` is the whole file
+        self._pending = head
+        self._fileobj = fileobj
+
+    def read(self, size=-1):
+        if self._pending:
+            if size is None or size < 0:
+                size = len(self._pending)
+            data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        return self._fileobj.read(size)
+
+
+def peek_file(fileobj, size=SNIFF_LENGTH):
+    '''
+    Read the beginning of the file, skipping the leading whitespace.
+    Binary files are read on, until their encoding can be detected
+    (see `prescan_done()`).
+    Return `(head, fileobj)`, where `fileobj` reads the file from `head` on.
+    '''
+    if isinstance(fileobj, _PeekedFile):
+        return fileobj.head, fileobj
+    head = fileobj.read(size)
+    while head and head.isspace():
+        head = fileobj.read(size)
+    # XML declaration must be at the very start of the document
+    head = head.lstrip()
+    complete = not head
+    while isinstance(head, bytes) and not complete and not prescan_done(head):
+        chunk = fileobj.read(size)
+        if chunk:
+            head += chunk
+        else:
+            complete = True
+    return head, _PeekedFile(head, fileobj, complete)
+
+
 class XPathExtractor(object):
     _parser = etree.HTMLParser
     _tostring_method = 'html'
+    _default_encoding = None  # of the bytes without any declared encoding
 
-    def __init__(self, body=None, namespaces=None, _root=None):
+    def __init__(self, body=None, namespaces=None, _root=None, encoding=None, **options):
         self.namespaces = namespaces
         if _root is None:
-            self._root = self._get_root(body)
+            self._root = self._get_root(body, encoding, options_key(options))
         else:
             self._root = _root
 
-    def _get_root(self, body, encoding=None):
-        body = body.strip() or self._empty_doc
+    def _get_root(self, body, encoding=None, options=()):
+        '''
+        `body` is either `str` or a bytes-like object (`bytes`, `bytearray`,
+        `memoryview`). Bytes are passed to libxml2 as they are, without
+        copying or decoding them in Python.
+
+        The encoding of the bytes is taken from (in this order of precedence)
+        the byte order mark, the transport-declared `encoding` (e.g. from
+        the Content-Type header), and the document itself (the XML declaration
+        or `<meta charset>` in HTML head, within the first `PRESCAN_LENGTH`
+        bytes). Undeclared bytes are decoded as UTF-8.
+
+        `options` are the options of lxml parser (see `PARSER_OPTIONS`),
+        as returned by `options_key()`.
+        '''
         if isinstance(body, str):
-            body = body.encode('utf-8')
-            encoding = 'utf-8'
-        parser = self._parser(recover=True, encoding=encoding)
-        return etree.fromstring(body, parser=parser)
+            match = _non_space_re.search(body)
+            if match is None:
+                body = self._empty_doc
+            elif match.start():
+                body = body[match.start():]
+            try:
+                return etree.fromstring(body, parser=self._pooled_parser(None, options))
+            except ValueError:
+                # lxml refuses `str` documents with the encoding declaration
+                body = body.encode('utf-8')
+                encoding = 'utf-8'
+        else:
+            match = _non_space_bytes_re.search(body)
+            if match is None:
+                body = self._empty_doc.encode('utf-8')
+            else:
+                encoding = self._detect_encoding(body, encoding)
+                if match.start():
+                    # XML declaration must be at the very start of the document
+                    with memoryview(body)[match.start():] as view:
+                        return etree.fromstring(view, parser=self._pooled_parser(encoding, options))
+        return etree.fromstring(body, parser=self._pooled_parser(encoding, options))
+
+    @classmethod
+    def _detect_encoding(cls, head, encoding, complete=True):
+        '''
+        Return the encoding libxml2 should use for the document starting
+        with bytes `head` (the whole document, if `complete` is True).
+        '''
+        if sniff_bom(head) is not None:
+            return None  # BOM takes precedence, libxml2 detects it
+        if encoding is not None:
+            encoding = libxml2_encoding(encoding)  # unsupported encoding is detected as if not given
+        if (encoding is None and cls._default_encoding is not None and
+                not declares_encoding(head, complete)):
+            return cls._default_encoding
+        return encoding
+
+    @classmethod
+    def from_file(cls, fileobj, namespaces=None, encoding=None, **options):
+        '''
+        Build the extractor from the file object (preferably opened in binary mode).
+        The file is read by lxml in chunks, so its content never exists
+        as a single Python object. Encoding is detected the same way as
+        for the bytes.
+        '''
+        options = options_key(options)
+        head, fileobj = peek_file(fileobj)
+        if not head:  # empty or whitespace only
+            return cls('', namespaces=namespaces)
+        parser = cls._get_parser(head, encoding, options, complete=fileobj.complete)
+        root = etree.parse(fileobj, parser=parser).getroot()
+        if root is None:  # e.g. only a comment or the XML declaration
+            return cls('', namespaces=namespaces)
+        return cls(namespaces=namespaces, _root=root)
+
+    @classmethod
+    def _get_parser(cls, head, encoding=None, options=(), pooled=True, complete=False):
+        '''
+        Return lxml parser for the document, which starts with `head` (without leading whitespace).
+        `complete` is True, if `head` is the whole document.
+        Parsers used for the incremental parsing (`feed()`) must not be `pooled`.
+        '''
+        if isinstance(head, str):
+            encoding = 'utf-8'  # lxml passes the text read from the file to libxml2 in UTF-8
+        else:
+            encoding = cls._detect_encoding(head, encoding, complete)
+        if pooled:
+            return cls._pooled_parser(encoding, options)
+        return cls._new_parser(encoding, options)
+
+    @classmethod
+    def _new_parser(cls, encoding=None, options=()):
+        return cls._parser(recover=True, encoding=encoding, **dict(options))
+
+    @classmethod
+    def _pooled_parser(cls, encoding=None, options=()):
+        '''
+        Return lxml parser from the pool of the current thread. lxml parsers
+        can't be shared by the threads, but the documents parsed one after
+        another in the same thread can reuse them, which saves their setup.
+        '''
+        pool = getattr(_parser_pool, 'parsers', None)
+        if pool is None:
+            pool = _parser_pool.parsers = {}
+        key = (cls._parser, encoding, options)
+        parser = pool.get(key)
+        if parser is None:
+            parser = pool[key] = cls._new_parser(encoding, options)
+        return parser
 
     def select(self, xpath):
         if not hasattr(self._root, 'xpath'):
@@ -73,3 +336,4 @@ class HtmlXPathExtractor(XPathExtractor):
     _parser = etree.HTMLParser
     _tostring_method = 'html'
     _empty_doc = '<html/>'
+    _default_encoding = 'utf-8'  # libxml2 would assume ISO-8859-1
@@ -1,15 +1,26 @@
-from datetime import datetime
+from time import perf_counter
 from urllib.parse import urljoin
+import copy
+import mmap
+import os
+import sys
+import threading
 
-from cssselect import GenericTranslator
 from lxml import etree
 
-from .extractors import XPathExtractor, HtmlXPathExtractor, XmlXPathExtractor
+from . import stats
+from .batch import parse_concurrent
+from .dates import DateTimeConverter
+from .extractors import XPathExtractor, HtmlXPathExtractor, XmlXPathExtractor, document_cache
+from .extractors.lxml_extractor import SNIFF_LENGTH, looks_like_xml, options_key, peek_file, prescan_done
 from .quantity import Quantity
+from .records import COLUMN_OUTPUTS, RECORD_TYPES, is_valid_field, numpy_available, record_class, to_arrays
+from .selectors import css_to_xpath
+from .xpath import join_steps, shared_prefix_length, split_steps
 
 
 __all__ = ['ParserError', 'ParsingError',
-           'Prefix', 'Group', 'Element', 'String', 'Url', 'DateTime', 'Date']
+           'Prefix', 'Group', 'Element', 'String', 'Url', 'DateTime', 'Date', 'ParserSet']
 
 
 class ParserError(Exception):
@@ -28,47 +39,245 @@ class BaseParser(object):
         if xpath:
             self.raw_xpath = xpath
         elif css:
-            self.raw_xpath = GenericTranslator().css_to_xpath(css)
+            self.raw_xpath = css_to_xpath(css)
         else:
             self.raw_xpath = 'self::*'
 
         self.namespaces = namespaces
-        self._compiled_xpath = None  # compile xpath lazily
+        # xpaths are compiled lazily and separately for each thread, since lxml
+        # serializes the evaluation of the shared `etree.XPath` object
+        self._compiled = threading.local()
 
     def __call__(self, body, url=None):
         return self.parse(body, url)
 
-    def parse(self, body, url=None):
+    def compile(self):
+        '''
+        Precompile all xpath expressions used by this parser (and its children),
+        so that no expression is compiled while parsing the documents.
+        Compiled expressions are kept per thread, so call it in every thread
+        that uses the parser.
+
+        Returns the parser itself, so it can be chained: `parser = Group(...).compile()`.
+        '''
+        self.compiled_xpath
+        return self
+
+    def parse(self, body, url=None, encoding=None, **options):
+        '''
+        Parse the document with `etree.XMLParser`, if it starts with the XML
+        declaration, otherwise with `etree.HTMLParser`.
+
+        `body` is either `str` or a bytes-like object (`bytes`, `bytearray`,
+        `memoryview`), which is passed to libxml2 without any copying.
+        `encoding` is the transport-declared encoding of the bytes (e.g. from
+        the Content-Type header). The byte order mark takes precedence over it.
+
+        Keyword `options` are passed to lxml parser: `remove_comments`,
+        `remove_blank_text`, `huge_tree`, `no_network` and `collect_ids`.
+        '''
         if isinstance(body, XPathExtractor):
-            extractor = body
+            root = body._root
+        elif looks_like_xml(body):
+            root = document_cache.get_root(XmlXPathExtractor, body, encoding, **options)
         else:
-            if '<?xml' in body[:128]:
-                extractor = XmlXPathExtractor(body)
-            else:
-                extractor = HtmlXPathExtractor(body)
-
-        return self._parse(extractor, {'url': url})
-
-    def parse_html(self, body, url=None):
+            root = document_cache.get_root(HtmlXPathExtractor, body, encoding, **options)
+
+        return self._parse(root, {'url': url})
+
+    def parse_file(self, source, url=None, encoding=None, **options):
+        '''
+        Parse the document stored in the file. `source` is either the path
+        of the file, or a file object opened in binary mode.
+
+        The file given by its path is memory-mapped and passed to lxml
+        as a buffer. The file object is read by lxml in chunks. In either
+        case the document is never loaded into a Python string.
+        '''
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:  # empty file can't be mapped
+                    return self.parse(b'', url, encoding, **options)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    return self.parse(buf, url, encoding, **options)
+
+        head, fileobj = peek_file(source)
+        extractor_class = XmlXPathExtractor if looks_like_xml(head) else HtmlXPathExtractor
+        root = extractor_class.from_file(fileobj, encoding=encoding, **options)._root
+        return self._parse(root, {'url': url})
+
+    def parse_html(self, body, url=None, encoding=None, **options):
         '''Force `etree.HTMLParser`.'''
-        return self._parse(HtmlXPathExtractor(body), {'url': url})
+        return self._parse(document_cache.get_root(HtmlXPathExtractor, body, encoding, **options), {'url': url})
 
-    def parse_xml(self, body, url=None):
+    def parse_xml(self, body, url=None, encoding=None, **options):
         '''Force `etree.XMLParser`.'''
-        return self._parse(XmlXPathExtractor(body), {'url': url})
-
-    def _parse(self, extractor, context):
-        nodes = extractor.select(self.compiled_xpath)
-        return self._process_nodes(nodes, context)
+        return self._parse(document_cache.get_root(XmlXPathExtractor, body, encoding, **options), {'url': url})
+
+    def feed_session(self, url=None, encoding=None, **options):
+        '''
+        Start the incremental parsing of the document arriving in chunks
+        of bytes (e.g. from the network), so that the document is being built
+        while it is still downloading:
+
+            session = parser.feed_session(url=url)
+            for chunk in response.iter_content(65536):
+                session.feed(chunk)
+            result = session.close()
+        '''
+        return FeedSession(self, url=url, encoding=encoding, **options)
+
+    def _parse(self, nodes, context):
+        '''
+        `nodes` is either a single raw lxml node or a list of them.
+        Parsers work with raw lxml nodes internally, `XPathExtractor` is only
+        used to build the document.
+        '''
+        if stats._collector is not None:
+            return stats._collector.parse(self, nodes, context)
+        return self._process_nodes(self._select(nodes), context)
+
+    def _run_callback(self, func):
+        collector = stats._collector
+        if collector is None:
+            return func()
+        start = perf_counter()
+        result = func()
+        collector.add_callback_time(self, perf_counter() - start)
+        return result
+
+    def _select(self, nodes):
+        if not isinstance(nodes, list):
+            nodes = [nodes]
+
+        xpath = self.compiled_xpath
+        selected = []
+        for node in nodes:
+            # text nodes, attribute values, etc. can't be evaluated against
+            if not hasattr(node, 'xpath'):
+                continue
+            result = xpath(node)
+            if isinstance(result, list):
+                selected.extend(result)
+            else:
+                selected.append(result)
+        return selected
 
     def _process_nodes(self, nodes, context):
         raise NotImplementedError
 
+    def parse_concurrent(self, bodies, urls=None, max_workers=None):
+        '''
+        Parse the documents from `bodies` iterable in a pool of `max_workers` threads.
+        See `xextract.batch.parse_concurrent()`.
+        '''
+        return parse_concurrent(self, bodies, urls=urls, max_workers=max_workers)
+
+    def to_spec(self):
+        '''
+        Return the declarative spec of the parser tree, which can be stored
+        as JSON. See `xextract.spec`.
+        '''
+        from .spec import to_spec
+        return to_spec(self)
+
+    def _spec_kwargs(self):
+        '''Return the arguments of the constructor, which build the same parser.'''
+        return {'xpath': self.raw_xpath, 'namespaces': self.namespaces}
+
+    def aparse(self, body, url=None, executor=None):
+        '''
+        Coroutine parsing the document in the `executor`.
+        See `xextract.aio.aparse()`.
+        '''
+        from .aio import aparse
+        return aparse(self, body, url=url, executor=executor)
+
+    def aparse_stream(self, bodies, executor=None, max_in_flight=8):
+        '''
+        Asynchronously parse the stream of documents with bounded concurrency.
+        See `xextract.aio.aparse_stream()`.
+        '''
+        from .aio import aparse_stream
+        return aparse_stream(self, bodies, executor=executor, max_in_flight=max_in_flight)
+
+    def __getstate__(self):
+        # compiled xpaths can't be pickled, they are recompiled lazily after unpickling
+        state = self.__dict__.copy()
+        del state['_compiled']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiled = threading.local()
+
     @property
     def compiled_xpath(self):
-        if self._compiled_xpath is None:
-            self._compiled_xpath = etree.XPath(self.raw_xpath, namespaces=self.namespaces)
-        return self._compiled_xpath
+        compiled = getattr(self._compiled, 'xpath', None)
+        if compiled is None:
+            compiled = self._compiled.xpath = etree.XPath(self.raw_xpath, namespaces=self.namespaces)
+        return compiled
+
+
+class FeedSession(object):
+    '''
+    Incremental parsing session returned by `BaseParser.feed_session()`.
+
+    The beginning of the document (at least the first kilobyte, up to the end
+    of HTML head or 64 kilobytes) is buffered to choose between `etree.XMLParser` and
+    `etree.HTMLParser` and to detect the encoding, the same way as
+    `BaseParser.parse()` does. The rest of the chunks is fed to lxml right away.
+    '''
+
+    def __init__(self, parser, url=None, encoding=None, **options):
+        self.parser = parser
+        self.url = url
+        self.encoding = encoding
+        self.options = options_key(options)
+        self._head = bytearray()  # beginning of the document, until the lxml parser is created
+        self._next_prescan = SNIFF_LENGTH  # length of the head, when to try to detect the encoding again
+        self._feed_parser = None
+        self._closed = False
+
+    def feed(self, chunk):
+        '''Feed the next chunk of the document (a bytes-like object).'''
+        if self._closed:
+            raise ValueError('Feed session is already closed.')
+        if not isinstance(chunk, bytes):
+            chunk = bytes(chunk)  # lxml feeds only `bytes`
+        if self._feed_parser is not None:
+            self._feed_parser.feed(chunk)
+            return
+        # XML declaration must be at the very start of the document
+        self._head += chunk if self._head else chunk.lstrip()
+        if len(self._head) >= self._next_prescan:
+            if prescan_done(self._head):
+                self._start()
+            else:
+                self._next_prescan = len(self._head) + SNIFF_LENGTH
+
+    def _start(self, complete=False):
+        head = bytes(self._head)
+        extractor_class = XmlXPathExtractor if looks_like_xml(head) else HtmlXPathExtractor
+        # the parser keeps the state between the chunks, so it can't come from the pool
+        self._feed_parser = extractor_class._get_parser(
+            head, self.encoding, self.options, pooled=False, complete=complete)
+        self._feed_parser.feed(head)
+        self._head = None
+
+    def close(self):
+        '''Finish the document and return the extracted data.'''
+        if self._closed:
+            raise ValueError('Feed session is already closed.')
+        self._closed = True
+        if self._feed_parser is None and not self._head:  # empty document
+            root = HtmlXPathExtractor('')._root
+        else:
+            if self._feed_parser is None:
+                self._start(complete=True)
+            root = self._feed_parser.close()
+            self._feed_parser = None
+        return self.parser._parse(root, {'url': self.url})
 
 
 def propagate_namespaces(parser):
@@ -81,6 +290,131 @@ def propagate_namespaces(parser):
                 propagate_namespaces(child)
 
 
+def namespaces_key(namespaces):
+    '''Hashable representation of the namespaces dictionary.'''
+    return tuple(sorted((namespaces or {}).items()))
+
+
+def selector_key(parser):
+    '''Hashable representation of the parser's selector.'''
+    return (parser.raw_xpath, namespaces_key(parser.namespaces))
+
+
+class SharedPrefix(object):
+    '''
+    Group of children parsers, whose selectors start with the same location
+    steps (e.g. `.price span` and `.price meta`). The shared steps are evaluated
+    only once for each context node and the rest of the selectors (suffixes)
+    is evaluated from the nodes matched by them.
+    '''
+
+    def __init__(self, prefix, namespaces, members):
+        self.prefix = prefix
+        self.compiled_prefix = etree.XPath(prefix, namespaces=namespaces)
+        # (child index, compiled suffix, True if suffix selects only from the subtree)
+        self.members = [
+            (index, etree.XPath(suffix, namespaces=namespaces), downward)
+            for index, suffix, downward in members]
+
+    def select(self, children, nodes, selected):
+        '''
+        Fill `selected[child_index]` with the nodes matched by the children
+        selectors, exactly as `children[child_index]._select(nodes)` would.
+        '''
+        for index, _, _ in self.members:
+            selected[index] = []
+
+        for node in nodes:
+            if not hasattr(node, 'xpath'):
+                continue
+            prefix_nodes = self.compiled_prefix(node)
+            # Results of the suffixes can be simply concatenated, if there is
+            # at most one prefix node, or the prefix nodes don't contain each
+            # other and the suffix selects only from their subtrees. Otherwise
+            # the results might not be in document order, so the whole selector
+            # is evaluated instead.
+            if all(hasattr(prefix_node, 'iterancestors') for prefix_node in prefix_nodes):
+                disjoint = len(prefix_nodes) <= 1 or _are_disjoint(prefix_nodes)
+                single = len(prefix_nodes) <= 1
+            else:
+                disjoint = single = False
+
+            for index, suffix, downward in self.members:
+                result = selected[index]
+                if single or disjoint and downward:
+                    for prefix_node in prefix_nodes:
+                        result.extend(suffix(prefix_node))
+                else:
+                    result.extend(children[index].compiled_xpath(node))
+
+
+def _are_disjoint(elements):
+    '''True, if none of the elements (in document order) is a descendant of another one.'''
+    for previous, element in zip(elements, elements[1:]):
+        for ancestor in element.iterancestors():
+            if ancestor is previous:
+                return False
+    return True
+
+
+def find_shared_prefixes(children):
+    '''Return the list of `SharedPrefix`es found among the `children` parsers.'''
+    candidates = {}
+    for index, child in enumerate(children):
+        # only the parsers selecting the nodes in the standard way
+        if type(child)._parse is not BaseParser._parse:
+            continue
+        steps = split_steps(child.raw_xpath)
+        if steps:
+            key = (steps[0], namespaces_key(child.namespaces))
+            candidates.setdefault(key, []).append((index, child, steps))
+
+    shared_prefixes = []
+    for members in candidates.values():
+        if len(members) < 2:
+            continue
+        length = shared_prefix_length([steps for _, _, steps in members])
+        if not length:
+            continue
+        shared_prefixes.append(SharedPrefix(
+            join_steps(members[0][2][:length]),
+            members[0][1].namespaces,
+            [(index, join_steps(steps[length:]) or 'self::node()',
+              all(step.is_downward for step in steps[length:]))
+             for index, child, steps in members]))
+    return shared_prefixes
+
+
+def record_fields(children):
+    '''Return the tuple of keys of the dictionary extracted by the `children` parsers.'''
+    fields = []
+    for child in children:
+        if isinstance(child, BaseNamedParser):
+            names = [child.name]
+        elif isinstance(child, Prefix) and child.callback is None:
+            names = record_fields(child.children)
+        else:
+            raise ParserError(
+                'Record fields can\'t be determined from %s parser. Use only named parsers '
+                'and Prefix parsers without callback.' % child.__class__.__name__)
+        for name in names:
+            if name not in fields:
+                fields.append(name)
+    return tuple(fields)
+
+
+def column_dtypes(children):
+    '''Return the numpy dtypes of the columns of `DateTime` and `Date` values extracted by the `children`.'''
+    dtypes = {}
+    for child in children:
+        if isinstance(child, Prefix):
+            dtypes.update(column_dtypes(child.children))
+        elif (isinstance(child, DateTime) and child.quantity.is_single and
+                child.callback is None and child.batch_callback is None):
+            dtypes[child.name] = 'datetime64[D]' if isinstance(child, Date) else 'datetime64[us]'
+    return dtypes
+
+
 class ChildrenParserMixin(object):
     def __init__(self, **kwargs):
         self.children = kwargs.pop('children', None)
@@ -97,6 +431,51 @@ class ChildrenParserMixin(object):
         # propagate namespaces to children parsers
         propagate_namespaces(self)
 
+    def _spec_kwargs(self):
+        kwargs = super(ChildrenParserMixin, self)._spec_kwargs()
+        kwargs['children'] = self.children
+        return kwargs
+
+    def compile(self):
+        super(ChildrenParserMixin, self).compile()
+        self.compiled_shared_prefixes
+        for child in self.children:
+            child.compile()
+        return self
+
+    @property
+    def compiled_shared_prefixes(self):
+        shared_prefixes = getattr(self._compiled, 'shared_prefixes', None)
+        if shared_prefixes is None:
+            shared_prefixes = self._compiled.shared_prefixes = find_shared_prefixes(self.children)
+        return shared_prefixes
+
+    def _parse_children(self, nodes, context):
+        '''Run the children parsers and merge their results into a single dictionary.'''
+        parsed_data = {}
+        shared_prefixes = self.compiled_shared_prefixes
+        if not shared_prefixes:
+            for child in self.children:
+                parsed_data.update(child._parse(nodes, context))
+            return parsed_data
+
+        if not isinstance(nodes, list):
+            nodes = [nodes]
+        selected = {}
+        for shared_prefix in shared_prefixes:
+            shared_prefix.select(self.children, nodes, selected)
+
+        collector = stats._collector
+        for index, child in enumerate(self.children):
+            child_selected = selected.get(index)
+            if child_selected is None:
+                parsed_data.update(child._parse(nodes, context))
+            elif collector is not None:
+                parsed_data.update(collector.parse(child, nodes, context, selected=child_selected, evaluated=True))
+            else:
+                parsed_data.update(child._process_nodes(child_selected, context))
+        return parsed_data
+
 
 class Prefix(ChildrenParserMixin, BaseParser):
     '''
@@ -108,24 +487,30 @@ class Prefix(ChildrenParserMixin, BaseParser):
         self.callback = kwargs.pop('callback', None)
         super(Prefix, self).__init__(**kwargs)
 
+    def _spec_kwargs(self):
+        kwargs = super(Prefix, self)._spec_kwargs()
+        kwargs['callback'] = self.callback
+        return kwargs
+
     def _process_nodes(self, nodes, context):
-        parsed_data = {}
-        for child in self.children:
-            parsed_data.update(child._parse(nodes, context))
+        parsed_data = self._parse_children(nodes, context)
 
         if self.callback is not None:
-            parsed_data = self.callback(parsed_data)
+            parsed_data = self._run_callback(lambda: self.callback(parsed_data))
 
         return parsed_data
 
 
 class BaseNamedParser(BaseParser):
-    def __init__(self, name=None, count=None, quant=None, callback=None, **kwargs):  # `quant` is deprecated
+    def __init__(self, name=None, count=None, quant=None, callback=None, batch_callback=None, **kwargs):  # `quant` is deprecated
         if quant is not None:
             if count is not None:
                 raise ParserError('At most one of "count" or "quant" attributes can be specified.')
             count = quant
 
+        if callback is not None and batch_callback is not None:
+            raise ParserError('At most one of "callback" or "batch_callback" attributes can be specified.')
+
         if count is None:
             count = '*'
 
@@ -133,6 +518,13 @@ class BaseNamedParser(BaseParser):
         self.name = name
         self.quantity = Quantity(count)
         self.callback = callback
+        self.batch_callback = batch_callback
+
+    def _spec_kwargs(self):
+        kwargs = super(BaseNamedParser, self)._spec_kwargs()
+        kwargs.update(name=self.name, count=self.quantity.raw_quantity,
+                      callback=self.callback, batch_callback=self.batch_callback)
+        return kwargs
 
     def _process_nodes(self, nodes, context):
         # validate number of nodes
@@ -149,7 +541,9 @@ class BaseNamedParser(BaseParser):
         values = self._process_named_nodes(nodes, context)
 
         if self.callback is not None:
-            values = [self.callback(x) for x in values]
+            values = self._run_callback(lambda: [self.callback(x) for x in values])
+        elif self.batch_callback is not None:
+            values = self._run_batch_callback(values)
 
         if self.name is None:
             return self._flatten_values(values)
@@ -159,9 +553,18 @@ class BaseNamedParser(BaseParser):
     def _process_named_nodes(self, nodes, context):
         raise NotImplementedError
 
+    def _run_batch_callback(self, values):
+        result = self._run_callback(lambda: self.batch_callback(values))
+        if len(result) != len(values):
+            raise ParsingError(
+                'Batch callback of parser %s returned %s values (%s expected).' %
+                (stats.parser_label(self), len(result), len(values)))
+        return result
+
     def _flatten_values(self, values):
         if self.quantity.is_single:
-            return values[0] if values else None
+            # `len()`, since the batch callback may return e.g. numpy array
+            return values[0] if len(values) else None
         else:
             return values
 
@@ -173,16 +576,121 @@ class Group(ChildrenParserMixin, BaseNamedParser):
 
     All parsers listed in `children` parameter must have `name` specified -
     this is then used as the key in dictionary.
+
+    To save the memory, when holding many records, set `output` to
+    "namedtuple" or "slots" to get the records as instances of a namedtuple
+    or `__slots__` class, whose fields are the names of the children.
+
+    Set `output` to "columns" to get a single dictionary of lists instead,
+    one list of values for each child name. Output "arrays" further converts
+    the columns of `DateTime` and `Date` values and the numeric columns into
+    numpy arrays (requires numpy).
     '''
 
+    def __init__(self, output='dict', **kwargs):
+        super(Group, self).__init__(**kwargs)
+        outputs = ('dict',) + RECORD_TYPES + COLUMN_OUTPUTS
+        if output not in outputs:
+            raise ParserError('Invalid output: %s. Expected one of: %s.' % (
+                repr(output), ', '.join(repr(x) for x in outputs)))
+        if output == 'arrays' and not numpy_available():
+            raise ParserError('Output "arrays" requires numpy to be installed.')
+        self.output = output
+        self.fields = None
+        self._column_dtypes = None
+        if output != 'dict':
+            self.fields = record_fields(self.children)
+        if output in RECORD_TYPES:
+            for name in self.fields:
+                if not is_valid_field(name):
+                    raise ParserError(
+                        'Invalid name of the record field: %s. Names of the children must be '
+                        'valid identifiers not starting with underscore.' % repr(name))
+        elif output == 'arrays':
+            self._column_dtypes = column_dtypes(self.children)
+
+    def _spec_kwargs(self):
+        kwargs = super(Group, self)._spec_kwargs()
+        kwargs['output'] = self.output
+        return kwargs
+
+    def compile(self):
+        super(Group, self).compile()
+        self.compiled_record_class
+        return self
+
+    @property
+    def compiled_record_class(self):
+        # kept with the compiled state, since the dynamically created class can't be pickled
+        cls = getattr(self._compiled, 'record_class', None)
+        if cls is None and self.output in RECORD_TYPES:
+            cls = self._compiled.record_class = record_class(self.output, self.fields)
+        return cls
+
     def _process_named_nodes(self, nodes, context):
-        values = []
+        if self.output in COLUMN_OUTPUTS:
+            # whole table is a single value (passed to the callback at once)
+            return [self._process_columns(nodes, context)]
+        return [self._process_record(node, context) for node in nodes]
+
+    def _process_record(self, node, context):
+        parsed_data = self._parse_children(node, context)
+        if self.output not in RECORD_TYPES:
+            return parsed_data
+        return self.compiled_record_class(*[parsed_data[name] for name in self.fields])
+
+    def _process_columns(self, nodes, context):
+        columns = dict((name, []) for name in self.fields)
+        appends = [(name, columns[name].append) for name in self.fields]
         for node in nodes:
-            child_parsed_data = {}
-            for child in self.children:
-                child_parsed_data.update(child._parse(node, context))
-            values.append(child_parsed_data)
-        return values
+            parsed_data = self._parse_children(node, context)
+            for name, append in appends:
+                append(parsed_data[name])
+        if self.output == 'arrays':
+            columns = to_arrays(columns, self._column_dtypes)
+        return columns
+
+    def _flatten_values(self, values):
+        if self.output in COLUMN_OUTPUTS:
+            return values[0]
+        return super(Group, self)._flatten_values(values)
+
+    def iterparse(self, source, tag, url=None, html=False):
+        '''
+        Stream the data out of huge documents using `etree.iterparse`.
+
+        `source` is a filename or a file-like object. Every time an element
+        with the given `tag` is completely parsed, the children parsers are run
+        on it and the extracted dictionary (passed through `callback`, if
+        specified) is yielded. Processed elements are then removed from the
+        tree, so the memory consumption stays constant.
+
+        Selector of the group itself is ignored, `tag` is used instead (use
+        "{uri}tag" notation for namespaced tags). Children selectors should be
+        relative to the record element, since the rest of the document is
+        either not parsed yet or already discarded.
+
+        Columnar outputs ("columns", "arrays") can't be streamed.
+        '''
+        if self.output in COLUMN_OUTPUTS:
+            raise ParserError('Output "%s" is not supported by iterparse().' % self.output)
+        self.compile()
+        return self._iterparse(source, tag, url, html)
+
+    def _iterparse(self, source, tag, url, html):
+        for _, element in etree.iterparse(source, events=('end',), tag=tag, html=html, recover=True):
+            # fresh context for every record, so the per-document memos don't grow with the stream
+            value = self._process_record(element, {'url': url})
+            if self.callback is not None:
+                value = self._run_callback(lambda: self.callback(value))
+            elif self.batch_callback is not None:
+                value = self._run_batch_callback([value])[0]
+            yield value
+
+            # free the processed element and everything parsed before it
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
 
 
 class Element(BaseNamedParser):
@@ -191,10 +699,37 @@ class Element(BaseNamedParser):
 
     If you use xpath expression and match the text content of the element
     (e.g. `text()` or `@attr`), unicode is returned.
+
+    Returned elements (and the "smart" strings returned by lxml) reference
+    the whole document tree, which is kept in memory as long as they are.
+    Set `detach` to True to return the deep copies of the matched elements
+    (without their tail text) and plain strings instead, so that the document
+    can be freed right after the parsing.
     '''
 
+    def __init__(self, detach=False, **kwargs):
+        super(Element, self).__init__(**kwargs)
+        self.detach = detach
+
+    def _spec_kwargs(self):
+        kwargs = super(Element, self)._spec_kwargs()
+        kwargs['detach'] = self.detach
+        return kwargs
+
     def _process_named_nodes(self, nodes, context):
-        return [node._root for node in nodes]
+        if self.detach:
+            return [_detach_node(node) for node in nodes]
+        return list(nodes)
+
+
+def _detach_node(node):
+    if isinstance(node, etree._Element):
+        node = copy.deepcopy(node)  # copy of the subtree in a new document
+        node.tail = None
+        return node
+    if isinstance(node, str):
+        return str(node)
+    return node
 
 
 class String(BaseNamedParser):
@@ -203,26 +738,67 @@ class String(BaseNamedParser):
 
     By default, `String` extracts the text content of only the matched element,
     but not its descendants. To extract and concatenate the text out of every
-    descendant element, use `attr` parameter with the special value "_all_text"
+    descendant element, use `attr` parameter with the special value "_all_text".
+    Special value "_normalized_text" does the same, but also strips
+    the leading and trailing whitespace and collapses the inner whitespace
+    into single spaces (only spaces, tabs and newlines count as whitespace,
+    as in xpath `normalize-space()`).
+
+    Set `intern` to True to intern the extracted strings (`sys.intern()`),
+    so that the repeated values (e.g. categories or currencies) share
+    a single string object.
     '''
 
-    def __init__(self, attr='_text', **kwargs):
+    def __init__(self, attr='_text', intern=False, **kwargs):
         super(String, self).__init__(**kwargs)
+        self.raw_attr = attr
+        self.intern = intern
         if attr == '_text':
             self.attr = 'text()'
         elif attr == '_all_text':
-            self.attr = 'descendant-or-self::*/text()'
+            # concatenated by libxml2, same as joining `descendant-or-self::*/text()`
+            self.attr = 'string()'
+        elif attr == '_normalized_text':
+            self.attr = 'normalize-space()'
         elif attr == '_name':
             self.attr = 'name()'
         else:
             self.attr = '@' + attr
 
+    def _spec_kwargs(self):
+        kwargs = super(String, self)._spec_kwargs()
+        kwargs.update(attr=self.raw_attr, intern=self.intern)
+        return kwargs
+
+    def compile(self):
+        super(String, self).compile()
+        self.compiled_attr
+        return self
+
+    @property
+    def compiled_attr(self):
+        compiled = getattr(self._compiled, 'attr', None)
+        if compiled is None:
+            compiled = self._compiled.attr = etree.XPath(
+                self.attr, namespaces=self.namespaces, smart_strings=False)
+        return compiled
+
     def _process_named_nodes(self, nodes, context):
+        attr_xpath = self.compiled_attr
         values = []
         for node in nodes:
-            value = ''.join(node.select(self.attr).extract())
+            if hasattr(node, 'xpath'):
+                value = attr_xpath(node)
+                if isinstance(value, list):
+                    value = ''.join(value)
+            else:
+                value = ''
             values.append(value)
-        return self._process_values(values, context)
+        values = self._process_values(values, context)
+        if self.intern:
+            # after the processing, so that e.g. the resolved urls are interned
+            values = [sys.intern(value) if type(value) is str else value for value in values]
+        return values
 
     def _process_values(self, values, context):
         return values
@@ -244,31 +820,57 @@ class Url(String):
     def _process_values(self, values, context):
         url = context.get('url')
         if url:
+            # Resolved urls are memoized per document (and shared by all `Url`
+            # parsers in the tree), since pages tend to repeat the same links.
+            resolved_urls = context.get('resolved_urls')
+            if resolved_urls is None:
+                resolved_urls = context['resolved_urls'] = {}
+
             result = []
             for v in values:
-                clean_v = v.strip()
-                try:
-                    result.append(urljoin(url, clean_v))
-                # In rare cases, urljoin() might fail with ValueError.
-                except ValueError:
-                    result.append(clean_v)
+                resolved = resolved_urls.get(v)
+                if resolved is None:
+                    resolved = resolved_urls[v] = self._resolve_url(url, v.strip())
+                result.append(resolved)
             return result
         else:
             return [v.strip() for v in values]
 
+    def _resolve_url(self, url, clean_v):
+        if not clean_v:
+            return url  # same as urljoin(), without splitting the url
+        try:
+            return urljoin(url, clean_v)
+        # In rare cases, urljoin() might fail with ValueError.
+        except ValueError:
+            return clean_v
+
 
 class DateTime(String):
     '''
     Returns the `datetime.datetime` object constructed out of the extracted data:
         `datetime.strptime(extracted_data, format)`
+
+    Numeric formats are parsed by a precompiled regex and converted values
+    are memoized (see `xextract.dates.DateTimeConverter`).
     '''
 
     def __init__(self, format, **kwargs):
         super(DateTime, self).__init__(**kwargs)
         self.format = format
+        self.converter = DateTimeConverter(format)
+
+    def _spec_kwargs(self):
+        kwargs = super(DateTime, self)._spec_kwargs()
+        kwargs['format'] = self.format
+        return kwargs
+
+    def convert_values(self, values):
+        '''Convert the whole list of extracted strings at once.'''
+        return self.converter.convert_many(values)
 
     def _process_values(self, values, context):
-        return [datetime.strptime(v, self.format) for v in values]
+        return self.convert_values(values)
 
 
 class Date(DateTime):
@@ -277,6 +879,91 @@ class Date(DateTime):
         `datetime.strptime(extracted_data, format).date()`
     '''
 
-    def _process_values(self, values, context):
-        values = super(Date, self)._process_values(values, context)
-        return [v.date() for v in values]
+    def convert_values(self, values):
+        return [v.date() for v in super(Date, self).convert_values(values)]
+
+
+class ParserSet(BaseParser):
+    '''
+    Runs many independent parsers against a single document and returns
+    the dictionary of their results, keyed by the names of the parsers:
+
+        ParserSet({'products': Group(...), 'title': String(...)}).parse(body)
+
+    is equivalent to:
+
+        {'products': Group(...).parse(body), 'title': String(...).parse(body)}
+
+    but the document is parsed only once. The parsers with identical
+    selectors (e.g. `css="div.product"`) share a single evaluation of it and
+    the selectors starting with the same location steps (e.g. `.product` and
+    `.product .price`) share the evaluation of these steps, as in `Group`.
+    '''
+
+    def __init__(self, parsers=None, **kwargs):
+        super(ParserSet, self).__init__()
+        self.parsers = dict(parsers or {}, **kwargs)
+        if not self.parsers:
+            raise ParserError('You must specify at least one parser for ParserSet.')
+        for parser in self.parsers.values():
+            if not isinstance(parser, BaseParser):
+                raise ParserError('ParserSet accepts only parsers, %s received.' % repr(parser))
+
+    def _spec_kwargs(self):
+        return {'parsers': self.parsers}
+
+    def compile(self):
+        self.compiled_selectors
+        for parser in self.parsers.values():
+            parser.compile()
+        return self
+
+    @property
+    def compiled_selectors(self):
+        '''
+        Pair of the list of parsers with distinct selectors (one for each
+        selector) and the `SharedPrefix`es found among them.
+        '''
+        selectors = getattr(self._compiled, 'selectors', None)
+        if selectors is None:
+            distinct = {}
+            for parser in self.parsers.values():
+                if not isinstance(parser, ParserSet):  # nested set has no selector of its own
+                    distinct.setdefault(selector_key(parser), parser)
+            distinct = list(distinct.values())
+            selectors = self._compiled.selectors = (distinct, find_shared_prefixes(distinct))
+        return selectors
+
+    def _parse(self, nodes, context):
+        collector = stats._collector
+        selected_by_xpath = {}
+        distinct, shared_prefixes = self.compiled_selectors
+        if shared_prefixes:
+            if not isinstance(nodes, list):
+                nodes = [nodes]
+            selected = {}
+            for shared_prefix in shared_prefixes:
+                shared_prefix.select(distinct, nodes, selected)
+            for index, selected_nodes in selected.items():
+                selected_by_xpath[selector_key(distinct[index])] = selected_nodes
+
+        # the first parser with the selector is counted as the one evaluating it
+        evaluated_keys = set()
+        parsed_data = {}
+        for name, parser in self.parsers.items():
+            if isinstance(parser, ParserSet):
+                parsed_data[name] = parser._parse(nodes, context)
+                continue
+
+            key = selector_key(parser)
+            evaluated = key not in evaluated_keys
+            evaluated_keys.add(key)
+            selected = selected_by_xpath.get(key)
+            if selected is None:
+                selected = selected_by_xpath[key] = parser._select(nodes)
+
+            if collector is not None:
+                parsed_data[name] = collector.parse(parser, nodes, context, selected=selected, evaluated=evaluated)
+            else:
+                parsed_data[name] = parser._process_nodes(selected, context)
+        return parsed_data
@@ -0,0 +1,137 @@
+'''
+Compact record classes and columnar tables, which `Group` parser can output
+instead of the list of dictionaries.
+'''
+from collections import namedtuple
+from importlib.util import find_spec
+from keyword import iskeyword
+import threading
+
+
+RECORD_TYPES = ('namedtuple', 'slots')
+COLUMN_OUTPUTS = ('columns', 'arrays')
+
+# (record type, fields) -> record class
+_classes = {}
+_lock = threading.Lock()
+
+
+def is_valid_field(name):
+    return isinstance(name, str) and name.isidentifier() and not iskeyword(name) and not name.startswith('_')
+
+
+def record_class(record_type, fields):
+    '''
+    Return the record class of `record_type` ("namedtuple" or "slots")
+    with the given tuple of field names. The classes are created once
+    and shared by all the parsers with the same fields.
+    '''
+    key = (record_type, fields)
+    cls = _classes.get(key)
+    if cls is None:
+        with _lock:
+            cls = _classes.get(key)
+            if cls is None:
+                if record_type == 'namedtuple':
+                    cls = _namedtuple_class(fields)
+                else:
+                    cls = _slots_class(fields)
+                _classes[key] = cls
+    return cls
+
+
+def _rebuild(record_type, fields, values):
+    # records are pickled by their fields, since their classes are created dynamically
+    return record_class(record_type, fields)(*values)
+
+
+def _namedtuple_class(fields):
+    class Record(namedtuple('Record', fields)):
+        __slots__ = ()
+
+        def __reduce__(self):
+            return _rebuild, ('namedtuple', self._fields, tuple(self))
+
+    return Record
+
+
+class SlotsRecord(object):
+    '''Base class of the records with `__slots__`, one for each field.'''
+
+    __slots__ = ()
+    _fields = ()
+
+    def _asdict(self):
+        return dict((name, getattr(self, name)) for name in self._fields)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self._fields)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None  # records are mutable
+
+    def __repr__(self):
+        return 'Record(%s)' % ', '.join('%s=%r' % (name, getattr(self, name)) for name in self._fields)
+
+    def __reduce__(self):
+        return _rebuild, ('slots', self._fields, tuple(self))
+
+
+def _slots_class(fields):
+    # generate `__init__` assigning the arguments directly, like `namedtuple` does
+    source = 'def __init__(_self, %s):\n%s' % (
+        ', '.join(fields),
+        ''.join('    _self.%s = %s\n' % (name, name) for name in fields) or '    pass\n')
+    namespace = {}
+    exec(source, namespace)
+    return type('Record', (SlotsRecord,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '__init__': namespace['__init__'],
+    })
+
+
+def numpy_available():
+    # numpy is imported only when the arrays are built
+    return find_spec('numpy') is not None
+
+
+def to_arrays(columns, dtypes):
+    '''
+    Convert the columns (lists of values) into numpy arrays. Columns listed in
+    `dtypes` are converted to the given dtype, other columns only if all their
+    values are booleans, integers or floats. The rest is left as lists.
+    '''
+    import numpy
+
+    arrays = {}
+    for name, values in columns.items():
+        dtype = dtypes.get(name) or _numeric_dtype(values)
+        if dtype is not None:
+            try:
+                values = numpy.array(values, dtype=dtype)
+            except OverflowError:  # too big integers
+                pass
+        arrays[name] = values
+    return arrays
+
+
+def _numeric_dtype(values):
+    types = set(map(type, values))
+    if not types:
+        return None
+    if types == {bool}:
+        return 'bool'
+    if types == {int}:
+        return 'int64'
+    if types <= {int, float}:
+        return 'float64'
+    return None
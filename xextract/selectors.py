@@ -0,0 +1,75 @@
+from collections import OrderedDict
+import json
+import threading
+
+from .utils import write_atomically
+
+
+__all__ = ['css_to_xpath', 'load_css_cache', 'save_css_cache', 'clear_css_cache']
+
+
+# maximum number of translated css selectors kept in the cache
+CSS_CACHE_SIZE = 4096
+
+_translator = None
+_cache = OrderedDict()  # css -> xpath, in the LRU order
+_lock = threading.Lock()
+
+
+def _get_translator():
+    global _translator
+    if _translator is None:
+        # cssselect is imported only when the first css selector is translated
+        from cssselect import GenericTranslator
+        _translator = GenericTranslator()
+    return _translator
+
+
+def css_to_xpath(css):
+    '''
+    Translate the css selector into xpath. Translations are kept in the
+    process-wide LRU cache of `CSS_CACHE_SIZE` selectors.
+    '''
+    with _lock:
+        xpath = _cache.get(css)
+        if xpath is not None:
+            _cache.move_to_end(css)
+            return xpath
+
+    xpath = _get_translator().css_to_xpath(css)
+    with _lock:
+        _cache[css] = xpath
+        while len(_cache) > CSS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return xpath
+
+
+def load_css_cache(path):
+    '''
+    Load the translations saved by `save_css_cache()` into the cache.
+    Missing file is ignored. Return the number of loaded translations.
+    '''
+    try:
+        with open(path, 'r') as f:
+            translations = json.load(f)
+    except FileNotFoundError:
+        return 0
+
+    with _lock:
+        for css, xpath in translations.items():
+            _cache.setdefault(css, xpath)
+        while len(_cache) > CSS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return len(translations)
+
+
+def save_css_cache(path):
+    '''Save the cached translations into the JSON file at `path`.'''
+    with _lock:
+        translations = dict(_cache)
+    write_atomically(path, json.dumps(translations))
+
+
+def clear_css_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,128 @@
+'''
+Declarative specs of the parser trees, which can be stored as JSON:
+
+    spec = parser.to_spec()
+    parser = from_spec(spec)
+
+Spec of a parser is the dictionary with the name of the parser class under
+"type" key and the arguments of its constructor. Selectors are stored as the
+translated xpaths and callbacks as their dotted import paths (e.g.
+"myproject.callbacks.parse_price"), so they must be module-level functions.
+
+`save_spec()` and `load_spec()` store the specs of many parsers in a single
+file, so the workers can load them at startup without translating
+the css selectors again.
+'''
+from importlib import import_module
+import json
+
+from . import parsers as parser_classes
+from .parsers import BaseParser, ParserError
+from .utils import write_atomically
+
+
+__all__ = ['to_spec', 'from_spec', 'save_spec', 'load_spec']
+
+
+# version of the format of the files written by `save_spec()`
+SPEC_VERSION = 1
+
+
+def to_spec(parser):
+    '''Return the spec of the parser tree.'''
+    spec = {'type': _type_name(type(parser))}
+    for key, value in parser._spec_kwargs().items():
+        if key == 'children':
+            value = [to_spec(child) for child in value]
+        elif key == 'parsers':
+            value = dict((name, to_spec(child)) for name, child in value.items())
+        elif key.endswith('callback') and value is not None:
+            value = callback_path(value)
+        spec[key] = value
+    return spec
+
+
+def from_spec(spec):
+    '''Build the parser tree out of its spec.'''
+    kwargs = dict(spec)
+    cls = _resolve_type(kwargs.pop('type'))
+    for key, value in kwargs.items():
+        if key == 'children':
+            kwargs[key] = [from_spec(child) for child in value]
+        elif key == 'parsers':
+            kwargs[key] = dict((name, from_spec(child)) for name, child in value.items())
+        elif key.endswith('callback') and value is not None:
+            kwargs[key] = resolve_callback(value)
+    return cls(**kwargs)
+
+
+def save_spec(path, parsers):
+    '''
+    Save the specs of `parsers` (dictionary of parsers, e.g. keyed by
+    the site) into the JSON file.
+    '''
+    data = {
+        'version': SPEC_VERSION,
+        'parsers': dict((name, to_spec(parser)) for name, parser in parsers.items()),
+    }
+    write_atomically(path, json.dumps(data, sort_keys=True))
+
+
+def load_spec(path):
+    '''Load the dictionary of parsers saved by `save_spec()`.'''
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != SPEC_VERSION:
+        raise ValueError('Unsupported version of the spec file %s: %s.' % (path, repr(data.get('version'))))
+    return dict((name, from_spec(spec)) for name, spec in data['parsers'].items())
+
+
+def callback_path(func):
+    '''Return the dotted import path of the callback function.'''
+    module = getattr(func, '__module__', None)
+    if module is None and hasattr(func, '__objclass__'):  # methods of builtin types, e.g. `str.strip`
+        module = func.__objclass__.__module__
+    path = '%s.%s' % (module, getattr(func, '__qualname__', None))
+    try:
+        resolved = resolve_callback(path)
+    except ParserError:
+        resolved = None
+    if resolved is not func:
+        raise ParserError(
+            'Callback %s can\'t be referenced by its import path. '
+            'Only module-level functions and classes are supported.' % repr(func))
+    return path
+
+
+def resolve_callback(path):
+    '''Import the object given by its dotted path, e.g. "package.module.function".'''
+    parts = path.split('.')
+    for i in range(len(parts) - 1, 0, -1):
+        try:
+            obj = import_module('.'.join(parts[:i]))
+        except ImportError:
+            continue
+        try:
+            for attr in parts[i:]:
+                obj = getattr(obj, attr)
+        except AttributeError:
+            break
+        return obj
+    raise ParserError('Can\'t import %s.' % repr(path))
+
+
+def _type_name(cls):
+    if getattr(parser_classes, cls.__name__, None) is cls:
+        return cls.__name__
+    # custom parser classes are referenced by the import path
+    return callback_path(cls)
+
+
+def _resolve_type(name):
+    if '.' not in name:
+        cls = getattr(parser_classes, name, None)
+    else:
+        cls = resolve_callback(name)
+    if not isinstance(cls, type) or not issubclass(cls, BaseParser):
+        raise ParserError('Unknown parser type: %s.' % repr(name))
+    return cls
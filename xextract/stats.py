@@ -0,0 +1,155 @@
+from time import perf_counter
+import threading
+
+from .utils import write_atomically
+
+
+__all__ = ['ParserStats']
+
+
+# currently active collector, None when the instrumentation is off
+_collector = None
+
+
+class ParserStats(object):
+    '''
+    Collects the timings and counters of every parser in the parser tree,
+    aggregated over all the documents parsed while the collector is active:
+
+        with ParserStats() as stats:
+            for body in bodies:
+                parser.parse(body)
+        print(stats.as_dict())
+
+    Parsers are identified by their path in the parser tree, e.g.
+    "Group(products)/String(price)". Recorded values:
+        calls - number of times the parser was run
+        seconds - wall time spent in the parser, including its children
+        xpath_evaluations - number of nodes the parser's xpath was evaluated against
+        nodes_matched - number of nodes matched by the parser's xpath
+        callback_seconds - wall time spent in the parser's callback
+
+    The collector is active in all threads. When no collector is active,
+    the instrumentation costs a single global lookup per parser run.
+    '''
+
+    _fields = ('calls', 'seconds', 'xpath_evaluations', 'nodes_matched', 'callback_seconds')
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._previous = None
+
+    def __enter__(self):
+        global _collector
+        self._previous = _collector
+        _collector = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _collector
+        _collector = self._previous
+        self._previous = None
+
+    def _get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, path, calls=0, seconds=0.0, xpath_evaluations=0, nodes_matched=0, callback_seconds=0.0):
+        with self._lock:
+            stats = self._stats.get(path)
+            if stats is None:
+                stats = self._stats[path] = [0, 0.0, 0, 0, 0.0]
+            stats[0] += calls
+            stats[1] += seconds
+            stats[2] += xpath_evaluations
+            stats[3] += nodes_matched
+            stats[4] += callback_seconds
+
+    def parse(self, parser, nodes, context, selected=None, evaluated=False):
+        '''
+        Instrumented version of `BaseParser._parse()`.
+        If `selected` nodes are passed, the parser's xpath is not evaluated
+        and it's counted as evaluated only if `evaluated` is True.
+        '''
+        if not isinstance(nodes, list):
+            nodes = [nodes]
+
+        stack = self._get_stack()
+        label = parser_label(parser)
+        stack.append('%s/%s' % (stack[-1], label) if stack else label)
+        try:
+            start = perf_counter()
+            if selected is None:
+                selected = parser._select(nodes)
+                evaluated = True
+            if evaluated:
+                xpath_evaluations = sum(1 for node in nodes if hasattr(node, 'xpath'))
+            else:
+                xpath_evaluations = 0
+            result = parser._process_nodes(selected, context)
+            seconds = perf_counter() - start
+        finally:
+            path = stack.pop()
+
+        self._record(
+            path, calls=1, seconds=seconds,
+            xpath_evaluations=xpath_evaluations,
+            nodes_matched=len(selected))
+        return result
+
+    def add_callback_time(self, parser, seconds):
+        stack = self._get_stack()
+        self._record(stack[-1] if stack else parser_label(parser), callback_seconds=seconds)
+
+    def as_dict(self):
+        '''Return `{parser_path: {field: value}}` dictionary.'''
+        with self._lock:
+            return dict(
+                (path, dict(zip(self._fields, stats)))
+                for path, stats in self._stats.items())
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def to_prometheus(self, path=None, prefix='xextract_parser'):
+        '''
+        Return the statistics in Prometheus text format. If `path` is
+        specified, write them also into the file (e.g. for node exporter's
+        textfile collector).
+        '''
+        metrics = (
+            ('calls_total', 'calls', 'Number of parser runs.'),
+            ('seconds_total', 'seconds', 'Wall time spent in the parser, including its children.'),
+            ('xpath_evaluations_total', 'xpath_evaluations', 'Number of nodes the xpath was evaluated against.'),
+            ('nodes_matched_total', 'nodes_matched', 'Number of nodes matched by the xpath.'),
+            ('callback_seconds_total', 'callback_seconds', 'Wall time spent in the callback.'))
+
+        stats = self.as_dict()
+        lines = []
+        for suffix, field, help_text in metrics:
+            name = '%s_%s' % (prefix, suffix)
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s counter' % name)
+            for parser_path in sorted(stats):
+                lines.append('%s{parser="%s"} %r' % (name, _escape_label(parser_path), stats[parser_path][field]))
+        text = '\n'.join(lines) + '\n'
+
+        if path is not None:
+            write_atomically(path, text)  # the scraper never reads partial file
+        return text
+
+
+def parser_label(parser):
+    name = getattr(parser, 'name', None)
+    if name is None:
+        name = parser.raw_xpath
+    return '%s(%s)' % (parser.__class__.__name__, name)
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,13 @@
+import os
+
+
+def write_atomically(path, text):
+    '''
+    Write `text` into the file at `path`. The text is written into
+    a temporary file first, which then replaces `path`, so the concurrent
+    readers never see a partially written file.
+    '''
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,153 @@
+'''
+Static analysis of xpath expressions, used to optimize the parser tree.
+'''
+import re
+
+
+# location step without predicates
+_step_re = re.compile(r'''^(?:
+    \.\.?
+  | @(?:\*|[\w.-]+(?::[\w.-]+|:\*)?)
+  | (?:(?P<axis>[a-z-]+)::)?
+    (?:\*|[\w.-]+(?::[\w.-]+|:\*)?|(?:text|node|comment)\(\)|processing-instruction\((?:'[^']*'|"[^"]*")?\))
+)$''', re.VERBOSE)
+
+# axes selecting only the context node or the nodes in its subtree
+_downward_axes = frozenset(['child', 'descendant', 'descendant-or-self', 'self', 'attribute'])
+
+_expand_steps = frozenset(['descendant-or-self::node()', 'descendant-or-self::*'])
+
+
+class Step(object):
+    '''Single location step of the xpath, e.g. `descendant::a[@href]`.'''
+
+    def __init__(self, text, bare):
+        self.text = text  # the whole step
+        self.bare = bare  # the step without predicates
+
+    @property
+    def is_downward(self):
+        if self.bare == '..':
+            return False
+        if self.bare == '.' or self.bare.startswith('@'):
+            return True
+        axis = _step_re.match(self.bare).group('axis')
+        return axis is None or axis in _downward_axes
+
+    @property
+    def is_expansion(self):
+        '''True, if the step just expands the context to all its descendants.'''
+        return self.text == self.bare and self.bare in _expand_steps
+
+    def __eq__(self, other):
+        return isinstance(other, Step) and self.text == other.text
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return 'Step(%r)' % self.text
+
+
+def split_steps(xpath):
+    '''
+    Split the relative location path into the list of `Step`s, so that
+    `xpath` is equivalent to `"/".join(step.text for step in steps)`.
+
+    Return None, if `xpath` is not a plain relative location path
+    (e.g. absolute path, union, function call or comparison).
+    '''
+    texts = []
+    text = []
+    depth = 0  # nesting of [] and ()
+    quote = None
+    for char in xpath:
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 0:
+            if char == '|':
+                return None
+            if char == '/':
+                step_text = ''.join(text).strip()
+                if not step_text:
+                    if not texts:
+                        return None  # absolute path
+                    # "a//b" is an abbreviation of "a/descendant-or-self::node()/b"
+                    step_text = 'descendant-or-self::node()'
+                texts.append(step_text)
+                text = []
+                continue
+        text.append(char)
+
+    step_text = ''.join(text).strip()
+    if quote is not None or depth != 0 or not step_text:
+        return None
+    texts.append(step_text)
+
+    steps = []
+    for step_text in texts:
+        bare = _strip_predicates(step_text)
+        if bare is None or not _step_re.match(bare):
+            return None
+        steps.append(Step(step_text, bare))
+    return steps
+
+
+def _strip_predicates(step):
+    '''Remove top-level predicates `[...]` out of the step.'''
+    result = []
+    depth = 0
+    quote = None
+    for char in step:
+        if quote is not None:
+            if char == quote:
+                quote = None
+            if depth == 0:
+                result.append(char)
+            continue
+        if char in '\'"':
+            quote = char
+        elif char == '[':
+            depth += 1
+            continue
+        elif char == ']':
+            depth -= 1
+            continue
+        if depth == 0:
+            result.append(char)
+    if depth != 0:
+        return None
+    return ''.join(result)
+
+
+def join_steps(steps):
+    return '/'.join(step.text for step in steps)
+
+
+def shared_prefix_length(steps_list):
+    '''
+    Return the number of leading steps shared by all the lists of steps,
+    not counting trailing expansion steps (like `descendant-or-self::*`),
+    which are better left to the suffixes.
+    '''
+    length = min(len(steps) for steps in steps_list)
+    first = steps_list[0]
+    for i in range(length):
+        if any(steps[i] != first[i] for steps in steps_list[1:]):
+            length = i
+            break
+    while length and first[length - 1].is_expansion:
+        length -= 1
+    return length